@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+
+import csv
+import glob
+import json
+import os
+import sys
+
+from collections import deque
+from functools import partial
+
+import dot_stream
+from cache import cached, CACHE_ENV
+from reader import (
+    read_task_graph,
+    read_task_graph_file,
+    read_system_graph,
+    read_system_graph_file,
+)
+from task_graph import TaskGraph, ALGORITHMS
+from transforms import transitive_reduction
+from validators import (
+    validate_acyclic,
+    validate_not_empty,
+    validate_connected,
+    ValidationError,
+)
+
+
+TASK = 'task'
+SYSTEM = 'system'
+
+# files are split between workers in ranges of this size
+CHUNK_BYTES = 64 * 1024 * 1024
+
+CSV_FIELDS = (
+    ['file', 'offset', 'kind', 'hash', 'nodes', 'edges', 'removed_edges',
+     'valid', 'error', 'critical_path', 'critical_path_node', 'width',
+     'parallelism']
+    + [alg.__name__ for alg in ALGORITHMS]
+)
+
+
+def find_graph_files(patterns):
+    """Yields ``.dot`` files of directories and globs in a stable order"""
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for (root, dirs, files) in os.walk(pattern):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.endswith('.dot'):
+                        yield os.path.join(root, name)
+        else:
+            yield from sorted(glob.iglob(pattern, recursive=True))
+
+
+def find_graphs(patterns, chunk=CHUNK_BYTES):
+    """Yields ``(filename, start, end)`` byte ranges of files of patterns
+
+    Files are not read here, graphs of a range are found by the worker
+    analysing it.
+    """
+    for filename in find_graph_files(patterns):
+        try:
+            size = os.path.getsize(filename)
+        except OSError:
+            size = 0
+        for start in range(0, max(size, 1), chunk):
+            yield (filename, start, start + chunk)
+
+
+def graph_offsets(filename, start=0, end=None):
+    """Offsets of graphs of a file with headers in ``[start, end)``"""
+    with open(filename, 'rb') as source:
+        if start:
+            # a line that began before start belongs to the previous range
+            source.seek(start - 1)
+            source.readline()
+        base = source.tell()
+        for offset in dot_stream.graph_offsets(source):
+            if end is not None and base + offset >= end:
+                return
+            yield base + offset
+
+
+def _kind(lines):
+    for line in lines:
+        words = line.split()
+        if not words:
+            continue
+        if words[0] in ('strict', 'digraph'):
+            return TASK if 'digraph' in words[:2] else SYSTEM
+        return SYSTEM if words[0] == 'graph' else None
+    return None
+
+
+def graph_kind(filename, offset=0):
+    with open(filename, 'rb') as source:
+        source.seek(offset)
+        return _kind(line.decode() for line in source)
+
+
+def analyse_task_graph(g, reduce=False):
+    kind = 'task_analysis_reduced' if reduce else 'task_analysis'
+    return cached(kind, [g], partial(_analyse_task_graph, g, reduce))
+
+
+def _analyse_task_graph(g, reduce):
+    record = {
+        'hash': g.content_hash(),
+        'nodes': len(g),
+        'edges': sum(node.conns_out for node in g),
+    }
+    validate_not_empty(g)
+    validate_acyclic(g)
+    if reduce:
+        (g, record['removed_edges']) = transitive_reduction(
+            g, precedence_only=True
+        )
+    tg = TaskGraph(g)
+    record['critical_path'] = tg.critical_path
+    record['critical_path_node'] = tg.critical_path_node
+    parallelism = tg.parallelism()
+    record['width'] = parallelism.width
+    record['parallelism'] = parallelism.average
+    record['critical_path_nodes'] = [n.id for n in tg.critical_path_nodes()]
+    record['queues'] = {
+        alg.__name__: [node.id for (node, _) in tg.prioritize_nodes(alg)]
+        for alg in ALGORITHMS
+    }
+    return record
+
+
+def analyse_system_graph(g):
+    return cached('system_analysis', [g], partial(_analyse_system_graph, g))
+
+
+def _analyse_system_graph(g):
+    record = {
+        'hash': g.content_hash(),
+        'nodes': len(g),
+        'edges': sum(node.conns_out for node in g) // 2,
+    }
+    validate_not_empty(g)
+    validate_connected(g)
+    return record
+
+
+def _analyse(record, kind, read_task, read_system, reduce):
+    record.update(kind=None, valid=False, error=None)
+    try:
+        kind = kind()
+        record['kind'] = kind
+        if kind == TASK:
+            record.update(analyse_task_graph(read_task(), reduce))
+        elif kind == SYSTEM:
+            record.update(analyse_system_graph(read_system()))
+        else:
+            raise ValueError('Not a DOT graph')
+    except ValidationError as e:
+        record['error'] = str(e)
+    except Exception as e:
+        record['error'] = f'{type(e).__name__}: {e}'
+    else:
+        record['valid'] = True
+    return record
+
+
+def analyse_file(filename, reduce=False, offset=0):
+    return _analyse(
+        {'file': filename, 'offset': offset},
+        partial(graph_kind, filename, offset),
+        partial(read_task_graph_file, filename, offset=offset),
+        partial(read_system_graph_file, filename, offset=offset),
+        reduce,
+    )
+
+
+def analyse_content(content, reduce=False):
+    """Record of the first graph in DOT ``content``"""
+    return _analyse(
+        {},
+        partial(_kind, content.splitlines()),
+        partial(read_task_graph, content),
+        partial(read_system_graph, content),
+        reduce,
+    )
+
+
+def bounded_map(executor, fn, items, window):
+    """Ordered ``executor.map`` keeping at most ``window`` pending calls"""
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+class JsonLinesWriter(object):
+    def __init__(self, output):
+        self._output = output
+
+    def write(self, record):
+        self._output.write(json.dumps(record) + '\n')
+        self._output.flush()
+
+
+class CsvWriter(object):
+    def __init__(self, output):
+        self._output = output
+        self._writer = csv.DictWriter(output, CSV_FIELDS)
+        self._writer.writeheader()
+
+    def write(self, record):
+        row = {k: v for (k, v) in record.items() if k in CSV_FIELDS}
+        for (alg, queue) in record.get('queues', {}).items():
+            row[alg] = ' '.join(map(str, queue))
+        self._writer.writerow(row)
+        self._output.flush()
+
+
+WRITERS = {
+    'jsonl': JsonLinesWriter,
+    'csv': CsvWriter,
+}
+
+
+def _analyse_range(graphs, reduce):
+    """Records of graphs of a file range, files without graph headers get
+    one record of offset 0"""
+    (filename, start, end) = graphs
+    try:
+        offsets = list(graph_offsets(filename, start, end))
+    except OSError:
+        offsets = []
+    if not offsets and start == 0:
+        offsets = [0]
+    return [analyse_file(filename, reduce, offset) for offset in offsets]
+
+
+def run(patterns, writer, jobs=None, window=None, reduce=False):
+    ranges = find_graphs(patterns)
+    analyse = partial(_analyse_range, reduce=reduce)
+    jobs = jobs or os.cpu_count()
+    if jobs == 1:
+        for records in map(analyse, ranges):
+            for record in records:
+                writer.write(record)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(jobs) as executor:
+        for records in bounded_map(executor, analyse, ranges,
+                                   window or jobs * 4):
+            for record in records:
+                writer.write(record)
+
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser
+
+    ap = ArgumentParser(description='Analyse task and system graph files')
+    ap.add_argument('paths', nargs='+',
+                    help='Directories or globs of .dot files')
+    ap.add_argument('--jobs', '-j', type=int,
+                    help='Number of worker processes, defaults to CPU count')
+    ap.add_argument('--window', type=int,
+                    help='Max number of graphs in flight, '
+                         'defaults to 4 * jobs')
+    ap.add_argument('--format', '-f', choices=sorted(WRITERS),
+                    default='jsonl', help='Output format')
+    ap.add_argument('--transitive-reduction', action='store_true',
+                    help='Drop implied edges before computing metrics, '
+                         'changes connectivity based queues')
+    ap.add_argument('--cache',
+                    help='SQLite file of cached results, defaults to '
+                         f'${CACHE_ENV}')
+    ap.add_argument('--output', '-o', help='Write output to file')
+    opts = ap.parse_args()
+    if opts.cache is not None:
+        os.environ[CACHE_ENV] = opts.cache
+    if opts.output is not None:
+        output = open(opts.output, 'w', newline='')
+    else:
+        output = sys.stdout
+    try:
+        run(opts.paths, WRITERS[opts.format](output), opts.jobs, opts.window,
+            opts.transitive_reduction)
+    finally:
+        if output is not sys.stdout:
+            output.close()
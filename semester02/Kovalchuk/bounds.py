@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+import numpy as np
+
+from graph import topological_order
+from scheduler import list_schedule
+from task_graph import alg_critical_path_start
+
+
+def _performance(systems):
+    """Max and total processor performance of every system"""
+    fastest = np.array([max(p.weight for p in s) for s in systems], float)
+    total = np.array([sum(p.weight for p in s) for s in systems], float)
+    return (fastest, total)
+
+
+def work_bound(tgs, systems):
+    """Total work over total performance, array of graphs by systems"""
+    work = np.array([sum(node.weight for node in tg.g) for tg in tgs], float)
+    (_, total) = _performance(systems)
+    return np.outer(work, 1 / total)
+
+
+def critical_path_bound(tgs, systems):
+    """Critical path on the fastest processor, array of graphs by systems"""
+    path = np.array([tg.critical_path for tg in tgs], float)
+    (fastest, _) = _performance(systems)
+    return np.outer(path, 1 / fastest)
+
+
+def _communication_bound(graph, fastest, single):
+    """Makespan bound of one graph on systems of given ``fastest`` processor
+
+    A task starts once every input either came over at least one hop from
+    another processor, or was computed on its processor. Inputs computed
+    locally run one after another, so the bound is the cheapest split of
+    inputs into remote and local ones, remote being those that arrive last.
+    Tasks run on the fastest processor, ``single`` marks systems where
+    every task runs on the same one.
+    """
+    columns = len(fastest)
+    start = {}
+    finish = {}
+    makespan = np.zeros(columns)
+    for node in topological_order(graph):
+        edges = list(node.connections_in)
+        if not edges:
+            begin = np.zeros(columns)
+        else:
+            earliest = np.array([start[e.source.id] for e in edges])
+            ready = np.array([finish[e.source.id] for e in edges])
+            busy = np.outer([e.source.weight for e in edges], 1 / fastest)
+            cost = np.array([e.weight for e in edges], float)[:, None]
+            remote = np.where(single, np.inf, ready + cost)
+            # local inputs are the first ones in order of remote arrival
+            order = np.argsort(-remote, axis=0)
+            remote = np.take_along_axis(remote, order, axis=0)
+            local = np.maximum(
+                np.maximum.accumulate(
+                    np.take_along_axis(ready, order, axis=0), axis=0),
+                np.minimum.accumulate(
+                    np.take_along_axis(earliest, order, axis=0), axis=0)
+                + np.cumsum(np.take_along_axis(busy, order, axis=0), axis=0),
+            )
+            rest = np.vstack([remote[1:], np.zeros((1, columns))])
+            begin = np.vstack([remote[:1], np.maximum(local, rest)]).min(0)
+        start[node.id] = begin
+        finish[node.id] = begin + node.weight / fastest
+        makespan = np.maximum(makespan, finish[node.id])
+    return makespan
+
+
+def communication_bound(tgs, systems):
+    """Communication-aware bound, array of graphs by systems
+
+    It is never below ``critical_path_bound``.
+    """
+    (fastest, _) = _performance(systems)
+    single = np.array([len(s) == 1 for s in systems])
+    return np.array([
+        _communication_bound(tg.g, fastest, single) for tg in tgs
+    ]).reshape(len(tgs), len(systems))
+
+
+def lower_bound(tgs, systems):
+    """Best of the lower bounds, array of graphs by systems
+
+    No schedule of a graph on a system is shorter, so a pair can be skipped
+    when its bound is not below the best makespan found so far.
+    """
+    return np.maximum(work_bound(tgs, systems),
+                      communication_bound(tgs, systems))
+
+
+def upper_bound(tg, system, routes=None):
+    """Makespan of a fast greedy schedule"""
+    return list_schedule(tg, system, alg_critical_path_start,
+                         routes=routes).makespan
+
+
+def upper_bounds(tgs, systems):
+    return np.array([
+        [upper_bound(tg, system) for system in systems] for tg in tgs
+    ]).reshape(len(tgs), len(systems))
+
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser
+
+    from experiment import load_topology
+    from reader import read_task_graph_file
+    from task_graph import TaskGraph
+
+    ap = ArgumentParser(description='Print makespan bounds of task graphs '
+                                    'on system graphs')
+    ap.add_argument('--tasks', nargs='+', required=True,
+                    help='Task graph files')
+    ap.add_argument('--systems', nargs='+', required=True,
+                    help='System graph files or generated topologies, '
+                         'like ring:16 or mesh:4x4')
+    opts = ap.parse_args()
+    tgs = [TaskGraph(read_task_graph_file(f)) for f in opts.tasks]
+    systems = [load_topology(spec) for spec in opts.systems]
+    bounds = (
+        work_bound(tgs, systems),
+        critical_path_bound(tgs, systems),
+        communication_bound(tgs, systems),
+        upper_bounds(tgs, systems),
+    )
+    print(f'{"tasks":<28}{"system":<28}'
+          f'{"work":>10}{"path":>10}{"comm":>10}{"greedy":>10}')
+    for (i, tasks) in enumerate(opts.tasks):
+        for (j, system) in enumerate(opts.systems):
+            print(f'{tasks:<28}{system:<28}'
+                  + ''.join(f'{b[i, j]:>10.4g}' for b in bounds))
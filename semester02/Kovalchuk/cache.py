@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import time
+
+from layout import layout_fingerprint
+
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+CACHE_ENV = 'PZKS_CACHE'
+
+_SOURCES = (
+    'graph.py',
+    'system_graph.py',
+    'task_graph.py',
+    'dot_stream.py',
+    'reader.py',
+    'layout.py',
+    'transforms.py',
+    'scheduler.py',
+    'batch.py',
+    'validators.py',
+)
+
+_code_version = None
+_default_caches = {}
+
+
+def code_version():
+    """Digest of sources results depend on, stale results never match"""
+    global _code_version
+    if _code_version is None:
+        digest = hashlib.blake2b(digest_size=8)
+        root = os.path.dirname(os.path.abspath(__file__))
+        for name in _SOURCES:
+            with open(os.path.join(root, name), 'rb') as source:
+                digest.update(source.read())
+        _code_version = digest.hexdigest()
+    return _code_version
+
+
+class ResultCache(object):
+    """SQLite-backed cache of JSON results with size-based LRU eviction
+
+    The database runs in WAL mode, so any number of processes may read it
+    while one of them writes. Access times are updated on a best-effort
+    basis and never make a reader wait for a writer.
+    """
+    def __init__(self, filename, max_bytes=DEFAULT_MAX_BYTES):
+        import sqlite3
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self._db = sqlite3.connect(filename, timeout=30,
+                                   isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS results ('
+            ' key TEXT PRIMARY KEY,'
+            ' value TEXT NOT NULL,'
+            ' size INTEGER NOT NULL,'
+            ' accessed REAL NOT NULL)'
+        )
+        self._db.execute(
+            'CREATE INDEX IF NOT EXISTS results_accessed '
+            'ON results (accessed)'
+        )
+
+    @staticmethod
+    def key(kind, *parts):
+        return ':'.join((code_version(), kind) + parts)
+
+    def get(self, key):
+        import sqlite3
+        row = self._db.execute(
+            'SELECT value FROM results WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        try:
+            self._db.execute(
+                'UPDATE results SET accessed = ? WHERE key = ?',
+                (time.time(), key),
+            )
+        except sqlite3.OperationalError:
+            pass
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        data = json.dumps(value)
+        self._db.execute('BEGIN IMMEDIATE')
+        try:
+            self._db.execute(
+                'INSERT OR REPLACE INTO results (key, value, size, accessed) '
+                'VALUES (?, ?, ?, ?)',
+                (key, data, len(data), time.time()),
+            )
+            self._evict()
+        except BaseException:
+            self._db.execute('ROLLBACK')
+            raise
+        self._db.execute('COMMIT')
+
+    def _evict(self):
+        (total,) = self._db.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM results'
+        ).fetchone()
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes * 0.9
+        victims = []
+        for (key, size) in self._db.execute(
+                'SELECT key, size FROM results ORDER BY accessed'):
+            if excess <= 0:
+                break
+            victims.append((key,))
+            excess -= size
+        self._db.executemany('DELETE FROM results WHERE key = ?', victims)
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def close(self):
+        self._db.close()
+
+
+def default_cache():
+    """Cache at ``$PZKS_CACHE`` path, ``None`` when it is not set"""
+    filename = os.environ.get(CACHE_ENV)
+    if not filename:
+        return None
+    cache = _default_caches.get(filename)
+    if cache is None:
+        cache = _default_caches[filename] = ResultCache(filename)
+    return cache
+
+
+def cached(kind, graphs, compute):
+    """Result of ``compute()`` for ``graphs``, through the default cache
+
+    Results refer to node ids, so the key has node ids and the node-order
+    fingerprint of every graph next to its content hash.
+    """
+    cache = default_cache()
+    if cache is None:
+        return compute()
+    parts = []
+    for graph in graphs:
+        ids = ','.join(str(node.id) for node in graph).encode()
+        parts.append(graph.content_hash())
+        parts.append(layout_fingerprint(graph))
+        parts.append(hashlib.blake2b(ids, digest_size=8).hexdigest())
+    return cache.get_or_compute(ResultCache.key(kind, *parts), compute)
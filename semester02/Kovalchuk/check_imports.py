@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+import os
+import subprocess
+import sys
+
+
+CORE = (
+    'graph',
+    'system_graph',
+    'task_graph',
+    'validators',
+    'dot_stream',
+    'reader',
+    'layout',
+    'cache',
+    'scheduler',
+    'network',
+    'transforms',
+    'generator',
+    'batch',
+    'experiment',
+)
+
+# imported only by code paths that need them
+DEFERRED = (
+    'tkinter',
+    'dot_parser',
+    'pyparsing',
+    'sqlite3',
+    'multiprocessing',
+    'concurrent.futures',
+)
+
+_REPORT = 'import sys; print(" ".join(sys.modules))'
+
+
+def import_time(module):
+    """Microseconds spent importing ``module`` and modules it loaded
+
+    Runs a fresh interpreter, returns the time and heavy modules it loaded.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c',
+         f'import {module}; {_REPORT}'],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+    total = 0
+    for line in result.stderr.splitlines():
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].strip() == module:
+            total = int(fields[1])
+    loaded = set(result.stdout.split())
+    return (total, [name for name in DEFERRED if name in loaded])
+
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser
+
+    ap = ArgumentParser(description='Check import time of core modules')
+    ap.add_argument('modules', nargs='*', default=CORE,
+                    help='Modules to check, defaults to every core module')
+    ap.add_argument('--budget', type=float, default=75,
+                    help='Max import time of a module, in milliseconds')
+    opts = ap.parse_args()
+    failed = False
+    for module in opts.modules:
+        (total, heavy) = import_time(module)
+        status = 'ok'
+        if total > opts.budget * 1000:
+            status = 'over budget'
+        if heavy:
+            status = 'imports ' + ', '.join(heavy)
+        failed = failed or status != 'ok'
+        print(f'{module:<16}{total / 1000:8.1f} ms  {status}')
+    sys.exit(1 if failed else 0)
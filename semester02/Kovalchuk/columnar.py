@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+
+import numpy as np
+
+from dot_stream import NODE, EDGE
+from task_graph import PATH_END, PATH_END_NODE, PATH_START, PATH_START_NODE
+
+
+# levels smaller than this are not worth splitting between threads
+_CHUNK = 1 << 15
+
+
+class Columns(object):
+    """Task graph as arrays, tasks are referred to by their position
+
+    ``ids`` and ``weights`` are per task, ``sources``, ``targets`` and
+    ``edge_weights`` per edge.
+    """
+    def __init__(self, ids, weights, sources, targets, edge_weights):
+        self.ids = np.asarray(ids, np.int64)
+        self.weights = np.asarray(weights, np.int64)
+        self.sources = np.asarray(sources, np.int64)
+        self.targets = np.asarray(targets, np.int64)
+        self.edge_weights = np.asarray(edge_weights, np.int64)
+
+    @classmethod
+    def from_graph(cls, graph):
+        nodes = list(graph)
+        position = {node.id: ix for (ix, node) in enumerate(nodes)}
+        edges = [edge for node in nodes for edge in node.connections_out]
+        return cls(
+            [node.id for node in nodes],
+            [node.weight for node in nodes],
+            [position[edge.source.id] for edge in edges],
+            [position[edge.target.id] for edge in edges],
+            [edge.weight or 0 for edge in edges],
+        )
+
+    @classmethod
+    def from_statements(cls, statements):
+        """Columns of ``dot_stream`` statements, without building a graph
+
+        Tasks get ids ``1..n`` in file order, like ``reader`` gives them.
+        """
+        position = {}
+        weights = []
+        (sources, targets, edge_weights) = ([], [], [])
+        for statement in statements:
+            if statement[0] == EDGE:
+                sources.append(position[statement[1]])
+                targets.append(position[statement[2]])
+                edge_weights.append(statement[3] or 0)
+            elif statement[0] == NODE:
+                position[statement[1]] = len(weights)
+                weights.append(statement[2])
+        return cls(np.arange(1, len(weights) + 1), weights, sources, targets,
+                   edge_weights)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def to_dict(self, values):
+        """``{task id: value}`` of per task ``values``"""
+        return dict(zip(self.ids.tolist(), values.tolist()))
+
+
+def _csr(keys, values, n):
+    """``values`` grouped by ``keys``, the group of ``k`` is
+    ``values[indptr[k]:indptr[k + 1]]``"""
+    order = np.argsort(keys, kind='stable')
+    indptr = np.zeros(n + 1, np.int64)
+    np.cumsum(np.bincount(keys, minlength=n), out=indptr[1:])
+    return (indptr, values[order])
+
+
+def _segments(indptr, nodes):
+    """Positions of the groups of ``nodes``, and where each group starts"""
+    starts = indptr[nodes]
+    counts = indptr[nodes + 1] - starts
+    offsets = np.zeros(len(nodes), np.int64)
+    np.cumsum(counts[:-1], out=offsets[1:])
+    positions = (np.arange(counts.sum(), dtype=np.int64)
+                 + np.repeat(starts - offsets, counts))
+    return (positions, offsets, counts)
+
+
+def _segment_max(values, offsets, counts):
+    """Max of every segment, 0 for empty ones"""
+    result = np.zeros(len(offsets), values.dtype)
+    filled = counts > 0
+    if filled.any():
+        result[filled] = np.maximum.reduceat(values, offsets[filled])
+    return result
+
+
+def levels(columns):
+    """Tasks of every topological level, the first one has no predecessors
+
+    Level of a task is the number of tasks on the longest path to it.
+    """
+    n = len(columns)
+    (indptr, out) = _csr(columns.sources, columns.targets, n)
+    waiting = np.bincount(columns.targets, minlength=n)
+    frontier = np.flatnonzero(waiting == 0)
+    result = []
+    seen = 0
+    while len(frontier):
+        result.append(frontier)
+        seen += len(frontier)
+        (positions, _, _) = _segments(indptr, frontier)
+        (hit, count) = np.unique(out[positions], return_counts=True)
+        waiting[hit] -= count
+        frontier = hit[waiting[hit] == 0]
+    if seen != n:
+        raise ValueError('Task graph is not acyclic')
+    return result
+
+
+def _pull(indptr, neighbours, frontier, values, base):
+    """``base`` of the frontier plus the max of ``values`` of neighbours"""
+    (positions, offsets, counts) = _segments(indptr, frontier)
+    return base[frontier] + _segment_max(values[neighbours[positions]],
+                                         offsets, counts)
+
+
+def _each_level(levels, step, executor):
+    """Runs ``step(frontier)`` level by level, splitting wide levels into
+    chunks that run on ``executor``
+
+    Every chunk writes only values of its own tasks, and ``numpy`` releases
+    the GIL while it gathers and reduces.
+    """
+    for frontier in levels:
+        if executor is None or len(frontier) < 2 * _CHUNK:
+            step(frontier)
+        else:
+            chunks = np.array_split(frontier, len(frontier) // _CHUNK)
+            list(executor.map(step, chunks))
+
+
+def path_metrics(columns, jobs=1):
+    """``PATH_START``, ``PATH_END`` and their node counts as arrays
+
+    Levels are processed one after another, all tasks of a level at once,
+    each one pulling values of its predecessors or successors. With
+    ``jobs`` above one wide levels are split between threads.
+    """
+    n = len(columns)
+    tiers = levels(columns)
+    (in_indptr, preds) = _csr(columns.targets, columns.sources, n)
+    (out_indptr, succs) = _csr(columns.sources, columns.targets, n)
+    weights = columns.weights
+    zeros = np.zeros(n, np.int64)
+    ones = np.ones(n, np.int64)
+    path_start = np.zeros(n, np.int64)
+    finish = weights.copy()
+    path_start_node = np.zeros(n, np.int64)
+    for (level, frontier) in enumerate(tiers, 1):
+        path_start_node[frontier] = level
+    path_end = np.zeros(n, np.int64)
+    path_end_node = np.zeros(n, np.int64)
+
+    def forward(frontier):
+        path_start[frontier] = _pull(in_indptr, preds, frontier, finish,
+                                     zeros)
+        finish[frontier] += path_start[frontier]
+
+    def backward(frontier):
+        path_end[frontier] = _pull(out_indptr, succs, frontier, path_end,
+                                   weights)
+        path_end_node[frontier] = _pull(out_indptr, succs, frontier,
+                                        path_end_node, ones)
+
+    executor = None
+    if jobs > 1:
+        from concurrent.futures import ThreadPoolExecutor
+        executor = ThreadPoolExecutor(jobs)
+    try:
+        _each_level(tiers[1:], forward, executor)
+        _each_level(reversed(tiers), backward, executor)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return {
+        PATH_START: path_start,
+        PATH_START_NODE: path_start_node,
+        PATH_END: path_end,
+        PATH_END_NODE: path_end_node,
+    }
+
+
+if __name__ == '__main__':
+    import time
+    from argparse import ArgumentParser
+
+    import dot_stream
+
+    ap = ArgumentParser(description='Compute critical paths of a large task '
+                                    'graph with numpy')
+    ap.add_argument('tasks', help='Task graph file')
+    ap.add_argument('--jobs', '-j', type=int, default=1,
+                    help='Number of threads')
+    opts = ap.parse_args()
+    started = time.time()
+    with open(opts.tasks, 'rb') as source:
+        columns = Columns.from_statements(
+            dot_stream.statements(dot_stream.lines(source, use_mmap=True))
+        )
+    loaded = time.time()
+    metrics = path_metrics(columns, opts.jobs)
+    done = time.time()
+    print(f'Tasks: {len(columns)}, edges: {len(columns.sources)}')
+    print(f'Critical path: {metrics[PATH_END].max(initial=0)}, '
+          f'{metrics[PATH_END_NODE].max(initial=0)} tasks')
+    print(f'Read in {loaded - started:.2f}s, '
+          f'computed in {done - loaded:.2f}s')
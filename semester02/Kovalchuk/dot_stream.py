@@ -0,0 +1,138 @@
+import mmap
+import os
+import re
+
+from itertools import chain
+
+
+NODE = 'node'
+EDGE = 'edge'
+ATTR = 'attr'
+
+_HEADER = re.compile(rb'\s*(?:strict\s+)?(?:di)?graph\b[^{"]*\{\s*$')
+_CLOSE = re.compile(rb'\s*\}\s*$')
+_NODE = re.compile(rb'\s*Node_(\d+)\s*\[([^\]]*)\]\s*;?\s*$')
+_EDGE = re.compile(
+    rb'\s*Node_(\d+)\s*-[->]\s*Node_(\d+)\s*(?:\[([^\]]*)\])?\s*;?\s*$'
+)
+_ATTR = re.compile(rb'\s*(\w+)\s*=\s*("[^"]*"|[^\s;"]+)\s*;?\s*$')
+_ATTRS = re.compile(rb'(\w+)\s*=\s*("[^"]*"|[^\s,"]+)')
+_LABEL = re.compile(rb'\d+ \((-?\d+)\)$')
+
+
+class UnsupportedSyntax(ValueError):
+    pass
+
+
+def lines(source, use_mmap=False):
+    """Lines of binary file ``source`` from its current position
+
+    Lines are read in buffered chunks or over mmap.
+    """
+    if not use_mmap:
+        # not ``yield from``, closing the generator would close the file
+        for line in source:
+            yield line
+    elif os.fstat(source.fileno()).st_size:
+        with mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            data.seek(source.tell())
+            yield from iter(data.readline, b'')
+
+
+class _Counted(object):
+    """Iterator over lines that knows byte offset of the next one"""
+    def __init__(self, lines):
+        self._lines = iter(lines)
+        self.offset = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = next(self._lines)
+        self.offset += len(line)
+        return line
+
+
+def graph_offsets(lines):
+    """Byte offsets of graph header lines, without parsing the graphs"""
+    offset = 0
+    for line in lines:
+        if _HEADER.match(line):
+            yield offset
+        offset += len(line)
+
+
+def _attrs(text):
+    return {
+        name: value.strip(b'"')
+        for (name, value) in _ATTRS.findall(text or b'')
+    }
+
+
+def statements(lines):
+    """Yields statements of the first graph in the DOT dialect we write
+
+    Statements are ``(NODE, id, weight, pos)``, ``(EDGE, source, target,
+    weight)`` and ``(ATTR, name, value)``, ``pos`` and edge ``weight`` may be
+    ``None``. Lines are handled one at a time, anything beyond one node, edge
+    or graph attribute per line and edges between nodes not declared yet
+    raise ``UnsupportedSyntax``.
+    """
+    declared = set()
+    lines = iter(lines)
+    for line in lines:
+        if line.strip():
+            break
+    else:
+        raise UnsupportedSyntax('No graph found')
+    if not _HEADER.match(line):
+        raise UnsupportedSyntax('Expected graph header')
+    for (number, line) in enumerate(lines, 2):
+        match = _EDGE.match(line)
+        if match is not None:
+            (source, target) = (int(match.group(1)), int(match.group(2)))
+            if source not in declared or target not in declared:
+                raise UnsupportedSyntax(f'Line {number}: undeclared node')
+            label = _attrs(match.group(3)).get(b'label')
+            yield (EDGE, source, target,
+                   None if label is None else int(label))
+            continue
+        match = _NODE.match(line)
+        if match is not None:
+            attrs = _attrs(match.group(2))
+            label = _LABEL.match(attrs.get(b'label', b''))
+            if label is None:
+                raise UnsupportedSyntax(f'Line {number}: unexpected label')
+            declared.add(int(match.group(1)))
+            pos = attrs.get(b'pos')
+            yield (NODE, int(match.group(1)), int(label.group(1)),
+                   None if pos is None else pos.decode())
+            continue
+        if _CLOSE.match(line):
+            return
+        match = _ATTR.match(line)
+        if match is not None:
+            yield (ATTR, match.group(1).decode(),
+                   match.group(2).strip(b'"').decode())
+            continue
+        if line.strip():
+            raise UnsupportedSyntax(f'Line {number}: unsupported statement')
+    raise UnsupportedSyntax('Unterminated graph')
+
+
+def graphs(lines):
+    """Yields ``(offset, statements)`` of every graph in ``lines``
+
+    Statements of a graph have to be consumed before the next graph.
+    """
+    lines = _Counted(lines)
+    while True:
+        offset = lines.offset
+        for line in lines:
+            if line.strip():
+                break
+            offset = lines.offset
+        else:
+            return
+        yield (offset, statements(chain([line], lines)))
@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+
+import csv
+import hashlib
+import json
+import os
+import random
+import statistics
+import sys
+
+from collections import defaultdict
+from itertools import product
+
+from batch import bounded_map
+from generator import GraphBuilder, build_topology
+from reader import read_system_graph_file
+from scheduler import list_schedule, POLICIES
+from task_graph import TaskGraph, ALGORITHMS
+
+
+CELL_FIELDS = ('nodes', 'correlation', 'node_weight', 'link_weight',
+               'algorithm', 'policy', 'topology')
+# fields the task graph of a run is generated from
+GRAPH_FIELDS = ('nodes', 'correlation', 'node_weight', 'link_weight',
+                'repeat')
+STAT_FIELDS = ('makespan', 'speedup', 'efficiency')
+
+_algorithms = {alg.__name__: alg for alg in ALGORITHMS}
+_policies = {policy.__name__: policy for policy in POLICIES}
+_topologies = {}
+
+
+def expand_grid(grid, repeats):
+    """Yields runs, one per grid cell and repeat, in a stable order"""
+    values = [grid[field] for field in CELL_FIELDS]
+    for cell in product(*values):
+        for repeat in range(repeats):
+            run = dict(zip(CELL_FIELDS, cell))
+            run['repeat'] = repeat
+            yield run
+
+
+def run_key(run):
+    return json.dumps(run, sort_keys=True)
+
+
+def cell_key(run):
+    return json.dumps([run[field] for field in CELL_FIELDS])
+
+
+def _seed(run):
+    """Seed of the task graph, the same for every algorithm, policy and
+    topology of a cell"""
+    graph = json.dumps({field: run[field] for field in GRAPH_FIELDS},
+                       sort_keys=True)
+    digest = hashlib.blake2b(graph.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+def load_topology(spec):
+    system = _topologies.get(spec)
+    if system is None:
+        if os.path.exists(spec):
+            system = read_system_graph_file(spec)
+        else:
+            system = build_topology(spec)
+        system.freeze()
+        _topologies[spec] = system
+    return system
+
+
+def execute(run):
+    (min_node, max_node) = run['node_weight']
+    (min_link, max_link) = run['link_weight']
+    g = (
+        GraphBuilder(random.Random(_seed(run)))
+        .set_num_nodes(run['nodes'])
+        .set_node_weight(min_node, max_node)
+        .set_link_weight(min_link, max_link)
+        .set_correlation(run['correlation'])
+        .build()
+    )
+    g.freeze()
+    system = load_topology(run['topology'])
+    tg = TaskGraph(g)
+    schedule = list_schedule(tg, system, _algorithms[run['algorithm']],
+                             _policies[run['policy']])
+    sequential = sum(node.weight for node in g) / max(p.weight for p in system)
+    makespan = schedule.makespan
+    return dict(run, makespan=makespan, speedup=sequential / makespan,
+                efficiency=sequential / makespan / len(system))
+
+
+class Checkpoint(object):
+    """Append-only JSON Lines store of finished runs"""
+    def __init__(self, filename):
+        self.filename = filename
+        self.results = {}
+        valid_size = 0
+        if os.path.exists(filename):
+            with open(filename, 'rb') as source:
+                for line in source:
+                    if not line.endswith(b'\n'):
+                        break
+                    valid_size += len(line)
+                    try:
+                        result = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.results[run_key(_run_of(result))] = result
+        self._file = open(filename, 'a')
+        # drop a line torn by a crash in the middle of a write
+        self._file.truncate(valid_size)
+
+    def __contains__(self, run):
+        return run_key(run) in self.results
+
+    def add(self, result):
+        self._file.write(json.dumps(result) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.results[run_key(_run_of(result))] = result
+
+    def close(self):
+        self._file.close()
+
+
+def _run_of(result):
+    return {k: result[k] for k in CELL_FIELDS + ('repeat',)}
+
+
+def _normalize(run):
+    return dict(run, node_weight=list(run['node_weight']),
+                link_weight=list(run['link_weight']))
+
+
+def run_sweep(grid, repeats, checkpoint, jobs=None):
+    todo = (
+        run for run in map(_normalize, expand_grid(grid, repeats))
+        if run not in checkpoint
+    )
+    jobs = jobs or os.cpu_count()
+    if jobs == 1:
+        for result in map(execute, todo):
+            checkpoint.add(result)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(jobs) as executor:
+        for result in bounded_map(executor, execute, todo, jobs * 4):
+            checkpoint.add(result)
+
+
+def aggregate(results):
+    cells = defaultdict(list)
+    for result in results:
+        cells[cell_key(result)].append(result)
+    rows = []
+    for (key, runs) in sorted(cells.items()):
+        row = dict(zip(CELL_FIELDS, json.loads(key)))
+        row['runs'] = len(runs)
+        for field in STAT_FIELDS:
+            values = [r[field] for r in runs]
+            row[f'{field}_mean'] = statistics.mean(values)
+            row[f'{field}_stdev'] = (
+                statistics.stdev(values) if len(values) > 1 else 0.0
+            )
+            row[f'{field}_min'] = min(values)
+            row[f'{field}_max'] = max(values)
+        rows.append(row)
+    return rows
+
+
+def _weight_range(value):
+    (low, high) = value.split(':')
+    return (int(low), int(high))
+
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser
+
+    ap = ArgumentParser(description='Run a resumable parameter sweep')
+    ap.add_argument('--nodes', type=int, nargs='+', default=[10])
+    ap.add_argument('--correlation', type=float, nargs='+', default=[0.5])
+    ap.add_argument('--node-weight', type=_weight_range, nargs='+',
+                    default=[(1, 10)], help='Ranges like 1:10')
+    ap.add_argument('--link-weight', type=_weight_range, nargs='+',
+                    default=[(1, 10)], help='Ranges like 1:10')
+    ap.add_argument('--algorithm', nargs='+', default=sorted(_algorithms),
+                    choices=sorted(_algorithms))
+    ap.add_argument('--policy', nargs='+',
+                    default=[POLICIES[0].__name__], choices=sorted(_policies))
+    ap.add_argument('--topology', nargs='+', required=True,
+                    help='System graph files or generated topologies, '
+                         'like ring:16 or mesh:4x4')
+    ap.add_argument('--repeats', type=int, default=10,
+                    help='Number of generated graphs per cell')
+    ap.add_argument('--store', required=True,
+                    help='JSON Lines checkpoint, reused on restart')
+    ap.add_argument('--jobs', '-j', type=int,
+                    help='Number of worker processes, defaults to CPU count')
+    ap.add_argument('--output', '-o', help='Write aggregated CSV to file')
+    opts = ap.parse_args()
+    grid = {field: getattr(opts, field) for field in CELL_FIELDS}
+    checkpoint = Checkpoint(opts.store)
+    try:
+        run_sweep(grid, opts.repeats, checkpoint, opts.jobs)
+    finally:
+        checkpoint.close()
+    wanted = set(
+        run_key(run)
+        for run in map(_normalize, expand_grid(grid, opts.repeats))
+    )
+    rows = aggregate(
+        result for (key, result) in checkpoint.results.items()
+        if key in wanted
+    )
+    output = open(opts.output, 'w', newline='') if opts.output else sys.stdout
+    writer = csv.DictWriter(output, list(rows[0]) if rows else CELL_FIELDS)
+    writer.writeheader()
+    writer.writerows(rows)
+    if output is not sys.stdout:
+        output.close()
@@ -1,9 +1,12 @@
 #!/usr/bin/env python
 
+import operator
 import random
 
-from itertools import combinations, cycle
+from functools import reduce
+from itertools import combinations, cycle, product
 from graph import Graph
+from system_graph import Graph as SystemGraph
 
 
 class GraphBuilder(object):
@@ -71,7 +74,7 @@ class GraphBuilder(object):
                 except IndexError:
                     self._min_link_weight -= 1
                 continue
-            link = random.randint(self._min_link_weight, self._max_link_weight)
+            link = rand.randint(self._min_link_weight, self._max_link_weight)
             if link > links_aux:
                 link = links_aux
             links_aux -= link
@@ -93,6 +96,218 @@ class GraphBuilder(object):
         return g
 
 
+def _line(sizes):
+    n = sizes[0]
+    return ((i, i + 1) for i in range(n - 1))
+
+
+def _ring(sizes):
+    n = sizes[0]
+    yield from _line(sizes)
+    if n > 2:
+        yield (n - 1, 0)
+
+
+def _star(sizes):
+    return ((0, i) for i in range(1, sizes[0]))
+
+
+def _full(sizes):
+    return combinations(range(sizes[0]), 2)
+
+
+def _grid(sizes, wrap):
+    strides = [1]
+    for size in sizes[:-1]:
+        strides.append(strides[-1] * size)
+    for coords in product(*map(range, sizes)):
+        index = sum(c * s for (c, s) in zip(coords, strides))
+        for (axis, (c, size)) in enumerate(zip(coords, sizes)):
+            if c + 1 < size:
+                yield (index, index + strides[axis])
+            elif wrap and size > 2:
+                yield (index, index - c * strides[axis])
+
+
+def _mesh(sizes):
+    return _grid(sizes, wrap=False)
+
+
+def _torus(sizes):
+    return _grid(sizes, wrap=True)
+
+
+def _hypercube(sizes):
+    n = sizes[0]
+    dimension = n.bit_length() - 1
+    if n != 1 << dimension:
+        raise ValueError(f'Hypercube needs 2^k processors, got {n}')
+    return (
+        (i, i ^ (1 << bit))
+        for i in range(n)
+        for bit in range(dimension)
+        if i < i ^ (1 << bit)
+    )
+
+
+TOPOLOGIES = {
+    'line': _line,
+    'ring': _ring,
+    'star': _star,
+    'mesh': _mesh,
+    'torus': _torus,
+    'hypercube': _hypercube,
+    'full': _full,
+    'random_regular': None,
+}
+
+
+def _uniform(rand, low, high):
+    return rand.randint(low, high)
+
+
+def _normal(rand, low, high):
+    value = round(rand.gauss((low + high) / 2, (high - low) / 6))
+    return min(max(value, low), high)
+
+
+def _bimodal(rand, low, high):
+    return low if rand.random() < 0.5 else high
+
+
+DISTRIBUTIONS = {
+    'uniform': _uniform,
+    'normal': _normal,
+    'bimodal': _bimodal,
+}
+
+
+class SystemGraphBuilder(object):
+    def __init__(self, rand=None):
+        self._random = rand if rand is not None else random.Random()
+        self._topology = 'ring'
+        self._sizes = (8,)
+        self._degree = 3
+        self._min_performance = 1
+        self._max_performance = 1
+        self._distribution = 'uniform'
+
+    def _validate(self):
+        assert self._topology in TOPOLOGIES
+        assert all(size > 0 for size in self._sizes)
+        assert 0 < self._min_performance <= self._max_performance
+        assert self._distribution in DISTRIBUTIONS
+
+    def set_topology(self, topology):
+        self._topology = topology
+        return self
+
+    def set_num_processors(self, num_processors):
+        self._sizes = (int(num_processors),)
+        return self
+
+    def set_dimensions(self, *sizes):
+        self._sizes = tuple(map(int, sizes))
+        return self
+
+    def set_degree(self, degree):
+        self._degree = int(degree)
+        return self
+
+    def set_performance(self, min_performance=None, max_performance=None,
+                        distribution=None):
+        if min_performance is not None:
+            self._min_performance = int(min_performance)
+        if max_performance is not None:
+            self._max_performance = int(max_performance)
+        if distribution is not None:
+            self._distribution = distribution
+        return self
+
+    def _random_regular(self, n):
+        degree = self._degree
+        if n * degree % 2 or degree >= n:
+            raise ValueError(f'No {degree}-regular graph on {n} processors')
+        if 2 * degree < n:
+            return self._pairing(n, degree)
+        # dense graphs are the complement of a sparse one
+        missing = self._pairing(n, n - 1 - degree)
+        return {(a, b) for a in range(n) for b in range(a + 1, n)
+                if (a, b) not in missing}
+
+    def _pairing(self, n, degree):
+        """Random pairing of processor stubs, loops and duplicate links
+        repaired by switches with random links
+
+        A bad pair ``(a, b)`` and a link ``(c, d)`` become ``(a, c)`` and
+        ``(b, d)``, which keeps every degree.
+        """
+        rand = self._random
+        stubs = [i for i in range(n) for _ in range(degree)]
+        rand.shuffle(stubs)
+        edges = set()
+        bad = []
+        for ix in range(0, len(stubs), 2):
+            (a, b) = sorted(stubs[ix:ix + 2])
+            if a == b or (a, b) in edges:
+                bad.append((a, b))
+            else:
+                edges.add((a, b))
+        links = list(edges)
+        for (a, b) in bad:
+            for _ in range(100 * len(links) + 100):
+                ix = rand.randrange(len(links))
+                (c, d) = links[ix]
+                if rand.random() < 0.5:
+                    (c, d) = (d, c)
+                first = (min(a, c), max(a, c))
+                second = (min(b, d), max(b, d))
+                if a == c or b == d or first == second \
+                        or first in edges or second in edges:
+                    continue
+                edges.remove(links[ix])
+                edges.update((first, second))
+                links[ix] = first
+                links.append(second)
+                break
+            else:
+                raise ValueError(f'Failed to sample {degree}-regular graph')
+        return edges
+
+    def build(self) -> SystemGraph:
+        self._validate()
+        num_processors = reduce(operator.mul, self._sizes, 1)
+        distribution = DISTRIBUTIONS[self._distribution]
+        g = SystemGraph()
+        for _ in range(num_processors):
+            g.add_node(distribution(self._random, self._min_performance,
+                                    self._max_performance))
+        if self._topology == 'random_regular':
+            edges = self._random_regular(num_processors)
+        else:
+            edges = TOPOLOGIES[self._topology](self._sizes)
+        for (src, tgt) in edges:
+            g.connect(src + 1, tgt + 1)
+        return g
+
+
+def build_topology(spec, rand=None):
+    """Builds system graph from ``name:size[:degree]`` spec
+
+    Size is a processor count or ``AxB[xC]`` for meshes and tori, e.g.
+    ``ring:16``, ``torus:4x4x4``, ``random_regular:64:3``.
+    """
+    (topology, sizes, *degree) = spec.split(':')
+    builder = (
+        SystemGraphBuilder(rand if rand is not None else random.Random(0))
+        .set_topology(topology)
+        .set_dimensions(*sizes.split('x'))
+    )
+    if degree:
+        builder.set_degree(degree[0])
+    return builder.build()
+
+
 if __name__ == '__main__':
     from argparse import ArgumentParser
 
@@ -111,18 +326,52 @@ if __name__ == '__main__':
                     default=100)
     ap.add_argument('--correlation', type=float, help='Graph correlation',
                     default=0.5)
+    ap.add_argument('--topology', choices=sorted(TOPOLOGIES),
+                    help='Generate system graph of given topology instead')
+    ap.add_argument('--dimensions', type=int, nargs='+', default=[8],
+                    help='Number of processors or mesh/torus sizes')
+    ap.add_argument('--degree', type=int, default=3,
+                    help='Degree of random regular topology')
+    ap.add_argument('--min-performance', type=int, default=1,
+                    help='Min performance of processor')
+    ap.add_argument('--max-performance', type=int, default=1,
+                    help='Max performance of processor')
+    ap.add_argument('--distribution', choices=sorted(DISTRIBUTIONS),
+                    default='uniform',
+                    help='Processor performance distribution')
+    ap.add_argument('--count', type=int, default=1,
+                    help='Number of graphs to generate')
     ap.add_argument('--output', '-o', help='Write output to file')
+    ap.add_argument('--append', '-a', action='store_true',
+                    help='Append graphs to the output file')
     opts = ap.parse_args()
-    g = (
-        GraphBuilder()
-        .set_num_nodes(opts.nodes)
-        .set_node_weight(opts.min_node_weight, opts.max_node_weight)
-        .set_link_weight(opts.min_link_weight, opts.max_link_weight)
-        .set_correlation(opts.correlation)
-        .build()
-    )
+
+    def build():
+        if opts.topology is not None:
+            return (
+                SystemGraphBuilder()
+                .set_topology(opts.topology)
+                .set_dimensions(*opts.dimensions)
+                .set_degree(opts.degree)
+                .set_performance(opts.min_performance, opts.max_performance,
+                                 opts.distribution)
+                .build()
+            )
+        return (
+            GraphBuilder()
+            .set_num_nodes(opts.nodes)
+            .set_node_weight(opts.min_node_weight, opts.max_node_weight)
+            .set_link_weight(opts.min_link_weight, opts.max_link_weight)
+            .set_correlation(opts.correlation)
+            .build()
+        )
+
     if (opts.output) is not None:
-        with open(opts.output, 'w') as f:
-            f.write(str(g))
+        with open(opts.output, 'a' if opts.append else 'w') as f:
+            for _ in range(opts.count):
+                if f.tell():
+                    f.write('\n')
+                f.write(str(build()))
     else:
-        print(g)
+        for _ in range(opts.count):
+            print(build())
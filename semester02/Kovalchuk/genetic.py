@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+
+import os
+import time
+
+import numpy as np
+
+from graph import topological_order
+from scheduler import Routes, Schedule, list_schedule, POLICIES
+from task_graph import ALGORITHMS
+
+
+class _Problem(object):
+    """Task graph and system as arrays indexed by topological position
+
+    An individual is a row of task keys in ``[0, 1)`` and a row of processor
+    indexes. Tasks run in the order of their keys, each key raised to the
+    keys of its predecessors so the order is topological.
+    """
+    def __init__(self, tg, system):
+        order = topological_order(tg.g)
+        index = {node.id: ix for (ix, node) in enumerate(order)}
+        n = len(order)
+        self.task_ids = [node.id for node in order]
+        self.proc_ids = [proc.id for proc in system]
+        routes = Routes(system)
+        self.hops = np.array([[routes.hops(a, b) for b in self.proc_ids]
+                              for a in self.proc_ids], float)
+        self.duration = np.outer([node.weight for node in order],
+                                 [1 / proc.weight for proc in system])
+        width = max([node.conns_in for node in order] + [1])
+        # missing predecessors are task n, which finishes at 0 on processor 0
+        self.preds = np.full((n, width), n)
+        self.costs = np.zeros((n, width))
+        level = np.zeros(n, int)
+        for (t, node) in enumerate(order):
+            for (k, edge) in enumerate(node.connections_in):
+                source = index[edge.source.id]
+                self.preds[t, k] = source
+                self.costs[t, k] = edge.weight
+                level[t] = max(level[t], level[source] + 1)
+        self.levels = [np.flatnonzero(level == depth)
+                       for depth in range(1, level.max(initial=0) + 1)]
+
+    def random(self, count, rand):
+        keys = rand.random_sample((count, len(self.task_ids)))
+        procs = rand.randint(len(self.proc_ids),
+                             size=(count, len(self.task_ids)))
+        return (keys, procs)
+
+    def encode(self, schedule):
+        """Individual that decodes to ``schedule`` or a shorter one"""
+        index = {proc_id: ix for (ix, proc_id) in enumerate(self.proc_ids)}
+        starts = []
+        procs = []
+        for task_id in self.task_ids:
+            (proc_id, start, _) = schedule.assignments[task_id]
+            starts.append(start)
+            procs.append(index[proc_id])
+        rank = np.argsort(np.argsort(starts, kind='stable'), kind='stable')
+        return (rank / len(starts), np.array(procs))
+
+    def order(self, keys):
+        keys = np.hstack([keys, np.full((len(keys), 1), -np.inf)])
+        for tasks in self.levels:
+            keys[:, tasks] = np.maximum(keys[:, tasks],
+                                        keys[:, self.preds[tasks]].max(2))
+        return np.argsort(keys[:, :-1], axis=1, kind='stable')
+
+    def decode(self, keys, procs):
+        """Start and finish times of tasks of every individual"""
+        (count, n) = keys.shape
+        order = self.order(keys)
+        rows = np.arange(count)
+        column = rows[:, None]
+        procs = np.hstack([procs, np.zeros((count, 1), int)])
+        start = np.zeros((count, n))
+        finish = np.zeros((count, n + 1))
+        free = np.zeros((count, len(self.proc_ids)))
+        for step in range(n):
+            t = order[:, step]
+            p = procs[rows, t]
+            preds = self.preds[t]
+            hops = self.hops[procs[column, preds], p[:, None]]
+            ready = (finish[column, preds] + self.costs[t] * hops).max(1)
+            begin = np.maximum(free[rows, p], ready)
+            end = begin + self.duration[t, p]
+            start[rows, t] = begin
+            finish[rows, t] = end
+            free[rows, p] = end
+        return (start, finish[:, :n])
+
+    def makespan(self, keys, procs):
+        (_, finish) = self.decode(keys, procs)
+        return finish.max(1)
+
+    def schedule(self, keys, procs):
+        (start, finish) = self.decode(keys[None], procs[None])
+        schedule = Schedule()
+        for (t, task_id) in enumerate(self.task_ids):
+            schedule.assign(task_id, self.proc_ids[procs[t]], start[0, t],
+                            finish[0, t])
+        return schedule
+
+
+_shared = {}
+
+
+def _share(problem):
+    _shared['problem'] = problem
+
+
+def _evolve(island):
+    """Runs generations of one island, returns it sorted by makespan
+
+    Parents are picked by tournaments of two, a child takes every gene from
+    the better parent with probability 0.7. The ``elite`` best individuals
+    pass to the next generation unchanged.
+    """
+    (keys, procs, fitness, generations, mutation, elite, seed) = island
+    problem = _shared['problem']
+    rand = np.random.RandomState(seed)
+    (count, n) = keys.shape
+    for _ in range(generations + 1):
+        rank = np.argsort(fitness, kind='stable')
+        (keys, procs, fitness) = (keys[rank], procs[rank], fitness[rank])
+        if not generations:
+            break
+        generations -= 1
+        # population is sorted, so the lower index wins a tournament
+        (a, b) = rand.randint(count, size=(2, 2, count - elite)).min(1)
+        (first, second) = (np.minimum(a, b), np.maximum(a, b))
+        inherit = rand.random_sample((count - elite, n)) < 0.7
+        child_keys = np.where(inherit, keys[first], keys[second])
+        child_procs = np.where(inherit, procs[first], procs[second])
+        mutate = rand.random_sample(child_keys.shape) < mutation
+        child_keys[mutate] = rand.random_sample(mutate.sum())
+        mutate = rand.random_sample(child_procs.shape) < mutation
+        child_procs[mutate] = rand.randint(len(problem.proc_ids),
+                                           size=mutate.sum())
+        keys = np.vstack([keys[:elite], child_keys])
+        procs = np.vstack([procs[:elite], child_procs])
+        fitness = np.concatenate([
+            fitness[:elite], problem.makespan(child_keys, child_procs)
+        ])
+    return (keys, procs, fitness)
+
+
+def _migrate(islands, count):
+    """Best ``count`` individuals of every island replace the worst ones of
+    the next island"""
+    migrants = [(keys[:count], procs[:count], fitness[:count])
+                for (keys, procs, fitness) in islands]
+    return [
+        (np.vstack([keys[:-count], migrants[i - 1][0]]),
+         np.vstack([procs[:-count], migrants[i - 1][1]]),
+         np.concatenate([fitness[:-count], migrants[i - 1][2]]))
+        for (i, (keys, procs, fitness)) in enumerate(islands)
+    ]
+
+
+def _executor(jobs, problem):
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+        return ProcessPoolExecutor(jobs, mp_context=context)
+    return ProcessPoolExecutor(jobs, initializer=_share, initargs=(problem,))
+
+
+def evolve(tg, system, population=64, generations=100, islands=None,
+           migration=10, mutation=None, jobs=None, seed=None,
+           time_limit=None):
+    """Schedule of ``TaskGraph`` ``tg`` found by a genetic algorithm
+
+    Every island starts from the list schedules of all algorithms and
+    policies and random individuals, so the result is never longer than the
+    best list schedule. Islands evolve in a process pool, a whole population
+    is decoded at once with ``numpy``. Every ``migration`` generations the
+    best individuals of an island move to the next one, and the search stops
+    there once ``time_limit`` seconds passed.
+    """
+    deadline = None if time_limit is None else time.time() + time_limit
+    problem = _Problem(tg, system)
+    rand = np.random.RandomState(seed)
+    jobs = jobs or os.cpu_count()
+    islands = islands or jobs
+    if mutation is None:
+        mutation = min(0.05, 2 / len(problem.task_ids))
+    elite = max(1, population // 16)
+    routes = Routes(system)
+    seeds = [
+        problem.encode(list_schedule(tg, system, alg, policy, routes))
+        for alg in ALGORITHMS for policy in POLICIES
+    ][:population]
+    populations = []
+    for _ in range(islands):
+        (keys, procs) = problem.random(population, rand)
+        for (ix, (seed_keys, seed_procs)) in enumerate(seeds):
+            keys[ix] = seed_keys
+            procs[ix] = seed_procs
+        fitness = problem.makespan(keys, procs)
+        rank = np.argsort(fitness, kind='stable')
+        populations.append((keys[rank], procs[rank], fitness[rank]))
+    _share(problem)
+    executor = _executor(jobs, problem) if jobs > 1 else None
+    try:
+        done = 0
+        while done < generations:
+            step = min(migration, generations - done)
+            tasks = [
+                (keys, procs, fitness, step, mutation, elite,
+                 rand.randint(2 ** 31))
+                for (keys, procs, fitness) in populations
+            ]
+            if executor is None:
+                populations = list(map(_evolve, tasks))
+            else:
+                populations = list(executor.map(_evolve, tasks))
+            done += step
+            if deadline is not None and time.time() > deadline:
+                break
+            if len(populations) > 1:
+                populations = _migrate(populations, elite)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    (keys, procs, _) = min(populations, key=lambda island: island[2][0])
+    return problem.schedule(keys[0], procs[0])
+
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser
+
+    from reader import read_task_graph_file, read_system_graph_file
+    from task_graph import TaskGraph
+
+    ap = ArgumentParser(description='Improve list schedules of a task graph '
+                                    'with a genetic algorithm')
+    ap.add_argument('tasks', help='Task graph file')
+    ap.add_argument('system', help='System graph file')
+    ap.add_argument('--population', '-p', type=int, default=64,
+                    help='Number of individuals on an island')
+    ap.add_argument('--generations', '-g', type=int, default=100)
+    ap.add_argument('--islands', '-i', type=int,
+                    help='Number of islands, defaults to number of jobs')
+    ap.add_argument('--migration', '-m', type=int, default=10,
+                    help='Generations between migrations')
+    ap.add_argument('--jobs', '-j', type=int,
+                    help='Number of worker processes, defaults to CPU count')
+    ap.add_argument('--seed', type=int)
+    ap.add_argument('--time-limit', '-t', type=float,
+                    help='Stop at the first migration after given seconds')
+    opts = ap.parse_args()
+    tg = TaskGraph(read_task_graph_file(opts.tasks))
+    system = read_system_graph_file(opts.system)
+    schedule = evolve(tg, system, opts.population, opts.generations,
+                      opts.islands, opts.migration, jobs=opts.jobs,
+                      seed=opts.seed, time_limit=opts.time_limit)
+    print(f'Makespan: {schedule.makespan:g}')
+    print(schedule)
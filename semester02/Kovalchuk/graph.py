@@ -1,5 +1,9 @@
+import hashlib
+
 from itertools import chain
 
+from validators import CycleDetectedException
+
 
 class _Gen(object):
     def __init__(self):
@@ -102,11 +106,36 @@ class Edge(object):
         return self._target
 
 
+def topological_order(graph):
+    """Nodes of ``graph`` in a topological order, by Kahn's algorithm"""
+    waiting = {node.id: node.conns_in for node in graph}
+    order = [node for node in graph if waiting[node.id] == 0]
+    for node in order:
+        for edge in node.connections_out:
+            waiting[edge.target.id] -= 1
+            if waiting[edge.target.id] == 0:
+                order.append(edge.target)
+    if len(order) != len(waiting):
+        raise ValueError('Task graph is not acyclic')
+    return order
+
+
 class Graph(object):
+    """Nodes by id, along with sources, sinks and nodes by degree
+
+    The indexes are built by the first query and from then on kept up to
+    date by every change of the graph, so bulk loading does not pay for them.
+    A topological order is kept only after ``keep_order``.
+    """
     def __init__(self):
         self._gen = _Gen()
         self._nodes = {}
         self._frozen = False
+        self._sources = None
+        self._sinks = None
+        self._degrees = None
+        self._order = None
+        self._next_position = 0
 
     @classmethod
     def from_graph(cls, graph):
@@ -123,8 +152,15 @@ class Graph(object):
     def add_node(self, weight):
         if self._frozen:
             raise ValueError('Cannot add node to the frozen graph')
-        node = Node(self._gen(), weight=weight)
+        return self._add(Node(self._gen(), weight=weight))
+
+    def _add(self, node):
         self._nodes[node.id] = node
+        if self._order is not None:
+            self._order[node.id] = self._next_position
+            self._next_position += 1
+        if self._degrees is not None:
+            self._index(node)
         return node.id
 
     def del_node(self, node):
@@ -139,6 +175,10 @@ class Graph(object):
         to_disconnect.discard(node.id)
         for other_id in to_disconnect:
             self.disconnect(node.id, other_id)
+        if self._degrees is not None:
+            self._unindex(node)
+        if self._order is not None:
+            del self._order[node.id]
         del self._nodes[node.id]
 
     def connect(self, source, target, weight):
@@ -148,7 +188,9 @@ class Graph(object):
             source = self._nodes[source]
         if isinstance(target, int):
             target = self._nodes[target]
-        source.connect(target, weight)
+        if self._order is not None:
+            self._reorder(source, target)
+        self._change(source, target, source.connect, weight)
 
     def disconnect(self, source, target):
         if self._frozen:
@@ -157,15 +199,114 @@ class Graph(object):
             source = self._nodes[source]
         if isinstance(target, int):
             target = self._nodes[target]
-        source.disconnect(target)
+        self._change(source, target, source.disconnect)
+
+    def _change(self, source, target, change, *args):
+        if self._degrees is None:
+            return change(target, *args)
+        degrees = (_degree(source), _degree(target))
+        change(target, *args)
+        self._update(source, degrees[0])
+        if target is not source:
+            self._update(target, degrees[1])
+
+    def _update(self, node, old_degree):
+        node_id = node._id
+        if node._incoming:
+            self._sources.pop(node_id, None)
+        else:
+            self._sources.setdefault(node_id, node)
+        if node._outgoing:
+            self._sinks.pop(node_id, None)
+        else:
+            self._sinks.setdefault(node_id, node)
+        degree = _degree(node)
+        if degree != old_degree:
+            self._unbucket(node_id, old_degree)
+            self._degrees.setdefault(degree, set()).add(node_id)
+
+    def _unbucket(self, node_id, degree):
+        bucket = self._degrees[degree]
+        bucket.discard(node_id)
+        if not bucket:
+            del self._degrees[degree]
+
+    def _index(self, node):
+        if node.is_start_node:
+            self._sources[node.id] = node
+        if node.is_end_node:
+            self._sinks[node.id] = node
+        self._degrees.setdefault(node.conns, set()).add(node.id)
+
+    def _unindex(self, node):
+        self._sources.pop(node.id, None)
+        self._sinks.pop(node.id, None)
+        self._unbucket(node.id, node.conns)
+
+    def keep_order(self):
+        """Keeps a topological order of nodes from now on
+
+        ``connect`` then raises ``CycleDetectedException`` instead of adding
+        an edge that closes a cycle, so the graph stays acyclic.
+        """
+        if self._order is not None:
+            return
+        try:
+            order = topological_order(self)
+        except ValueError:
+            raise CycleDetectedException('Graph has a cycle') from None
+        self._order = {node.id: ix for (ix, node) in enumerate(order)}
+        self._next_position = len(order)
+
+    @property
+    def ordered(self):
+        return self._order is not None
+
+    def _reorder(self, source, target):
+        """Makes room for edge ``source -> target`` in the order
+
+        Pearce-Kelly: only nodes placed between ``target`` and ``source``
+        are visited, the ones reachable from ``target`` are moved after the
+        ones ``source`` is reachable from.
+        """
+        order = self._order
+        (lower, upper) = (order[target.id], order[source.id])
+        if lower > upper:
+            return
+        after = self._reach(target, lambda ix: ix < upper, 'target',
+                            '_outgoing', source)
+        before = self._reach(source, lambda ix: ix > lower, 'source',
+                             '_incoming')
+        nodes = (sorted(before, key=order.get)
+                 + sorted(after, key=order.get))
+        positions = sorted(order[node_id] for node_id in nodes)
+        for (node_id, position) in zip(nodes, positions):
+            order[node_id] = position
+
+    def _reach(self, start, within, end, edges, stop=None):
+        """Ids of nodes reached from ``start`` inside the ``within`` part of
+        the order, raises when ``stop`` is reached"""
+        if start is stop:
+            raise CycleDetectedException(f'Cycle detected: [{start.id}]')
+        order = self._order
+        seen = {start.id}
+        todo = [start]
+        while todo:
+            node = todo.pop()
+            for edge in getattr(node, edges).values():
+                other = getattr(edge, end)
+                if other is stop:
+                    raise CycleDetectedException(
+                        f'Edge {stop.id} -> {start.id} closes a cycle'
+                    )
+                if other.id not in seen and within(order[other.id]):
+                    seen.add(other.id)
+                    todo.append(other)
+        return seen
 
     def freeze(self):
         self._frozen = True
         self._reindex()
-        self._start_nodes = tuple(n for n in self._nodes.values()
-                                  if n.is_start_node)
-        self._end_nodes = tuple(n for n in self._nodes.values()
-                                if n.is_end_node)
 
     def _reindex(self):
         gen = _Gen()
@@ -181,20 +322,83 @@ class Graph(object):
                 for id_ in node._incoming.keys()
             }
         self._nodes = {node.id: node for node in self._nodes.values()}
+        if self._order is not None:
+            self._order = {mapping[id_]: position
+                           for (id_, position) in self._order.items()}
+        self._sources = None
+        self._sinks = None
+        self._degrees = None
+
+    def _ensure_index(self):
+        if self._degrees is None:
+            self._sources = {}
+            self._sinks = {}
+            self._degrees = {}
+            for node in self._nodes.values():
+                self._index(node)
 
     @property
     def start_nodes(self):
-        if self._frozen:
-            return self._start_nodes
-        else:
-            return tuple(n for n in self._nodes.values() if n.is_start_node)
+        """Live view of nodes without incoming edges
+
+        Nodes come in the order they lost their last input, which is graph
+        order unless the graph changed after the first query.
+        """
+        self._ensure_index()
+        return self._sources.values()
 
     @property
     def end_nodes(self):
-        if self._frozen:
-            return self._end_nodes
-        else:
-            return tuple(n for n in self._nodes.values() if n.is_end_node)
+        """Live view of nodes without outputs, like ``start_nodes``"""
+        self._ensure_index()
+        return self._sinks.values()
+
+    @property
+    def max_degree(self):
+        self._ensure_index()
+        return max(self._degrees, default=0)
+
+    def nodes_with_degree(self, degree):
+        """Nodes with ``degree`` connections in and out, in graph order"""
+        self._ensure_index()
+        return [self._nodes[id_]
+                for id_ in sorted(self._degrees.get(degree, ()))]
+
+    def content_hash(self):
+        """Hex digest of weights and structure, independent of node ids
+
+        Weisfeiler-Lehman refinement: a node label is rehashed together with
+        sorted labels and weights of its in and out neighbours until the
+        partition stops splitting, but at most ``log2(V) + 1`` rounds, which
+        keeps it O((V+E) log V). Equal graphs always get equal digests,
+        different ones only collide on rare WL-indistinguishable structures.
+        """
+        nodes = list(self._nodes.values())
+        kind = type(self).__module__.encode()
+        labels = {
+            node.id: _digest(kind, str(node.weight).encode())
+            for node in nodes
+        }
+        classes = len(set(labels.values()))
+        for _ in range(max(1, len(nodes).bit_length())):
+            refined = {}
+            for node in nodes:
+                outgoing = sorted(
+                    str(edge.weight).encode() + labels[edge.target.id]
+                    for edge in node.connections_out
+                )
+                incoming = sorted(
+                    str(edge.weight).encode() + labels[edge.source.id]
+                    for edge in node.connections_in
+                )
+                refined[node.id] = _digest(labels[node.id], b'>', *outgoing,
+                                           b'<', *incoming)
+            labels = refined
+            refined_classes = len(set(labels.values()))
+            if refined_classes == classes:
+                break
+            classes = refined_classes
+        return _digest(kind, *sorted(labels.values())).hex()
 
     @property
     def frozen(self):
@@ -209,13 +413,18 @@ class Graph(object):
     def __len__(self):
         return len(self._nodes)
 
-    def __str__(self):
+    def to_dot(self, positions=None, fingerprint=None):
+        positions = positions or {}
+        header = ['digraph TaskGraph {']
+        if fingerprint is not None:
+            header.append(f'\tfingerprint="{fingerprint}";')
         node_descs = []
         edge_descs = []
 
         for node in self._nodes.values():
             node_descs.append(
-                f'\tNode_{node.id} [label="{node.id} ({node.weight})"];'
+                f'\tNode_{node.id} [label="{node.id} ({node.weight})"'
+                f'{format_pos(positions.get(node.id))}];'
             )
             for edge in node.connections_out:
                 edge_descs.append(
@@ -223,12 +432,33 @@ class Graph(object):
                     f'[label="{edge.weight}"];'
                 )
         return '\n'.join([
-            'digraph TaskGraph {',
+            '\n'.join(header),
             '\n'.join(node_descs),
             '\n'.join(edge_descs),
             '}'
         ])
 
+    def __str__(self):
+        return self.to_dot()
+
+
+def _degree(node):
+    return len(node._incoming) + len(node._outgoing)
+
+
+def _digest(*parts):
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part)
+    return digest.digest()
+
+
+def format_pos(position):
+    if position is None:
+        return ''
+    (x, y) = position
+    return f', pos="{x:.2f},{y:.2f}"'
+
 
 if __name__ == '__main__':
     g = Graph()
@@ -0,0 +1,265 @@
+import hashlib
+import math
+import random
+
+from collections import defaultdict
+
+
+NODE_SEP = 80
+RANK_SEP = 80
+MARGIN = 40
+
+
+def _topological_order(graph):
+    """Kahn's order; cycles are broken at the node with fewest pending inputs
+
+    The editor allows drawing cyclic task graphs, so layout must not fail on
+    them, the cycle is reported by validators instead.
+    """
+    indegree = {node.id: node.conns_in for node in graph}
+    ready = [node.id for node in graph if indegree[node.id] == 0]
+    order = []
+    placed = set()
+    while len(order) < len(indegree):
+        if not ready:
+            nid = min((n for n in indegree if n not in placed),
+                      key=lambda n: indegree[n])
+            ready.append(nid)
+        nid = ready.pop()
+        if nid in placed:
+            continue
+        placed.add(nid)
+        order.append(nid)
+        for edge in graph[nid].connections_out:
+            target = edge.target.id
+            if target in placed:
+                continue
+            indegree[target] -= 1
+            if indegree[target] == 0:
+                ready.append(target)
+    return order
+
+
+def _longest_path_layers(graph, order):
+    position = {nid: ix for (ix, nid) in enumerate(order)}
+    layer = {}
+    for nid in order:
+        layer[nid] = max(
+            (layer[e.source.id] + 1 for e in graph[nid].connections_in
+             if position[e.source.id] < position[nid]),
+            default=0,
+        )
+    return layer
+
+
+def _build_layers(graph, order, layer):
+    """Split long edges with dummy vertices, returns layers and adjacency"""
+    layers = defaultdict(list)
+    up = defaultdict(list)
+    down = defaultdict(list)
+    for nid in order:
+        layers[layer[nid]].append(nid)
+    dummies = 0
+    for nid in order:
+        for edge in graph[nid].connections_out:
+            (source, target) = (nid, edge.target.id)
+            (low, high) = (layer[source], layer[target])
+            if high < low:
+                (source, target, low, high) = (target, source, high, low)
+            prev = source
+            for rank in range(low + 1, high):
+                dummies += 1
+                dummy = ('dummy', dummies)
+                layers[rank].append(dummy)
+                down[prev].append(dummy)
+                up[dummy].append(prev)
+                prev = dummy
+            if prev != target:
+                down[prev].append(target)
+                up[target].append(prev)
+    return [layers[rank] for rank in range(len(layers))], up, down
+
+
+def _reduce_crossings(layers, up, down, sweeps):
+    def reorder(layer, fixed, neighbours):
+        index = {v: ix for (ix, v) in enumerate(fixed)}
+
+        def barycenter(item):
+            (ix, v) = item
+            ns = [index[n] for n in neighbours[v] if n in index]
+            return (sum(ns) / len(ns)) if ns else ix
+        return [v for (_, v) in sorted(enumerate(layer), key=barycenter)]
+
+    for sweep in range(sweeps):
+        if sweep % 2 == 0:
+            for rank in range(1, len(layers)):
+                layers[rank] = reorder(layers[rank], layers[rank - 1], up)
+        else:
+            for rank in range(len(layers) - 2, -1, -1):
+                layers[rank] = reorder(layers[rank], layers[rank + 1], down)
+    return layers
+
+
+def _assign_coordinates(layers, up, down, node_sep, passes):
+    x = {}
+    for layer in layers:
+        offset = -(len(layer) - 1) * node_sep / 2
+        for (ix, v) in enumerate(layer):
+            x[v] = offset + ix * node_sep
+
+    def place(layer, neighbours):
+        desired = []
+        for v in layer:
+            ns = [x[n] for n in neighbours[v]]
+            desired.append(sum(ns) / len(ns) if ns else x[v])
+        placed = []
+        for want in desired:
+            if placed and want < placed[-1] + node_sep:
+                want = placed[-1] + node_sep
+            placed.append(want)
+        shift = (sum(desired) - sum(placed)) / len(placed)
+        for (v, pos) in zip(layer, placed):
+            x[v] = pos + shift
+
+    for step in range(passes):
+        if step % 2 == 0:
+            for layer in layers[1:]:
+                place(layer, up)
+        else:
+            for layer in reversed(layers[:-1]):
+                place(layer, down)
+    return x
+
+
+def layered_layout(graph, node_sep=NODE_SEP, rank_sep=RANK_SEP,
+                   margin=MARGIN, sweeps=8, passes=4):
+    """Sugiyama-style layout of a task graph
+
+    Longest-path layering, barycentric crossing reduction and barycentric
+    coordinate assignment. Returns ``{node_id: (x, y)}`` in canvas coordinates.
+    """
+    if len(graph) == 0:
+        return {}
+    order = _topological_order(graph)
+    layer = _longest_path_layers(graph, order)
+    (layers, up, down) = _build_layers(graph, order, layer)
+    layers = _reduce_crossings(layers, up, down, sweeps)
+    x = _assign_coordinates(layers, up, down, node_sep, passes)
+    min_x = min(x.values())
+    return {
+        nid: (margin + x[nid] - min_x, margin + layer[nid] * rank_sep)
+        for nid in order
+    }
+
+
+def force_layout(graph, width=560, height=400, margin=MARGIN,
+                 iterations=100, seed=0):
+    """Fruchterman-Reingold layout of a system graph
+
+    Returns ``{node_id: (x, y)}`` fitted into ``width`` x ``height`` canvas
+    box shifted by ``margin``. Forces of all nodes are computed at once with
+    ``numpy``. As in the grid variant of the algorithm, only nodes closer
+    than ``2k`` repel, and they are found in neighbouring cells of a grid.
+    """
+    # numpy takes longer to import than the rest of the editor
+    import numpy as np
+
+    ids = [node.id for node in graph]
+    if not ids:
+        return {}
+    if len(ids) == 1:
+        return {ids[0]: (margin + width / 2, margin + height / 2)}
+    index = {nid: ix for (ix, nid) in enumerate(ids)}
+    edges = set()
+    for node in graph:
+        for edge in node.connections_out:
+            (a, b) = (index[edge.source.id], index[edge.target.id])
+            if a != b:
+                edges.add((min(a, b), max(a, b)))
+    (sources, targets) = np.array(sorted(edges), int).reshape(-1, 2).T
+
+    rand = random.Random(seed)
+    n = len(ids)
+    k = math.sqrt(width * height / n)
+    pos = np.empty((n, 2))
+    for ix in range(n):
+        angle = 2 * math.pi * ix / n
+        pos[ix] = (width / 2 * (1 + math.cos(angle)) + rand.random(),
+                   height / 2 * (1 + math.sin(angle)) + rand.random())
+    temperature = width / 10
+    cooling = temperature / (iterations + 1)
+
+    for _ in range(iterations):
+        disp = np.empty((n, 2))
+        (first, second) = _near_pairs(pos, 2 * k)
+        (x, y) = (pos[:, 0].copy(), pos[:, 1].copy())
+        (dx, dy) = (x[first] - x[second], y[first] - y[second])
+        dist2 = np.maximum(dx * dx + dy * dy, 0.01)
+        # nodes farther than 2k do not repel
+        force = np.where(dist2 < 4 * k * k, k * k / dist2, 0)
+        disp[:, 0] = np.bincount(first, dx * force, n)
+        disp[:, 1] = np.bincount(first, dy * force, n)
+        delta = pos[sources] - pos[targets]
+        dist = np.sqrt((delta * delta).sum(1))
+        dist[dist == 0] = 0.1
+        force = delta * (dist / k)[:, None]
+        for axis in (0, 1):
+            disp[:, axis] -= (np.bincount(sources, force[:, axis], n)
+                              - np.bincount(targets, force[:, axis], n))
+        length = np.sqrt((disp * disp).sum(1))
+        length[length == 0] = 0.1
+        pos += disp * (np.minimum(length, temperature) / length)[:, None]
+        temperature -= cooling
+
+    (min_x, min_y) = pos.min(0).tolist()
+    (max_x, max_y) = pos.max(0).tolist()
+    scale = min(width / ((max_x - min_x) or 1),
+                height / ((max_y - min_y) or 1))
+    return {
+        nid: (margin + (x - min_x) * scale, margin + (y - min_y) * scale)
+        for (nid, (x, y)) in zip(ids, pos.tolist())
+    }
+
+
+def _near_pairs(pos, size):
+    """``(first, second)`` index arrays of ordered pairs of nodes in the same
+    or adjacent cells of a grid of ``size`` cells"""
+    import numpy as np
+
+    n = len(pos)
+    cells = np.floor(pos / size).astype(np.int64)
+    cells -= cells.min(0) - 1
+    span = cells[:, 1].max() + 2
+    keys = cells[:, 0] * span + cells[:, 1]
+    order = np.argsort(keys, kind='stable')
+    ordered = keys[order]
+    wanted = (keys[None] + np.array([
+        dx * span + dy for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+    ])[:, None]).ravel()
+    low = np.searchsorted(ordered, wanted, 'left')
+    counts = np.searchsorted(ordered, wanted, 'right') - low
+    starts = np.cumsum(counts) - counts
+    first = np.repeat(np.tile(np.arange(n), 9), counts)
+    second = order[np.arange(counts.sum()) + np.repeat(low - starts, counts)]
+    return (first, second)
+
+
+def layout_fingerprint(graph):
+    """Digest of the graph topology, positions are valid while it matches
+
+    Node ids are replaced by their position in the graph, as readers renumber
+    nodes in file order. Edges of a node are hashed in order of their
+    targets, files do not keep the order they were connected in.
+    """
+    index = {node.id: ix for (ix, node) in enumerate(graph)}
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(type(graph).__module__.encode())
+    for node in graph:
+        digest.update(f'n{index[node.id]}:{node.weight};'.encode())
+        for (target, weight) in sorted(
+                (index[edge.target.id], edge.weight)
+                for edge in node.connections_out):
+            digest.update(
+                f'e{index[node.id]}:{target}:{weight};'.encode()
+            )
+    return digest.hexdigest()
@@ -0,0 +1,308 @@
+import gc
+import heapq
+import math
+
+from scheduler import Routes, Schedule
+
+
+STORE_AND_FORWARD = 'store_and_forward'
+CIRCUIT_SWITCHED = 'circuit_switched'
+
+_INJECT = 0
+_HOP = 1
+_TASK_DONE = 2
+
+
+class Message(object):
+    __slots__ = ('id', 'source', 'target', 'size', 'ready', 'route',
+                 'links', 'link_ids', 'arrival', 'on_arrival')
+
+    def __init__(self, id_, source, target, size, ready, route, links,
+                 link_ids, on_arrival=None):
+        self.id = id_
+        self.source = source
+        self.target = target
+        self.size = size
+        self.ready = ready
+        self.route = route
+        self.links = links
+        self.link_ids = link_ids
+        self.arrival = None
+        self.on_arrival = on_arrival
+
+    def __str__(self):
+        return f'Message_{self.id}({self.source}->{self.target}, {self.size})'
+
+    def __repr__(self):
+        return str(self)
+
+
+class NetworkSimulator(object):
+    """Discrete-event simulator of message transfers over a system graph
+
+    A message is routed over shortest path of processors. In store-and-forward
+    mode it occupies one link at a time for ``size / bandwidth``, in
+    circuit-switched mode it reserves the whole route at once for
+    ``size / bandwidth + setup * hops``. Links serve messages in arrival
+    order, links are full duplex unless ``duplex`` is false.
+
+    Routes are computed once per pair of processors. A message crosses its
+    next link right away, without an event, while nothing else happens
+    before it gets there.
+    """
+    def __init__(self, system, mode=STORE_AND_FORWARD, bandwidth=1, setup=0,
+                 duplex=True, record=True, routes=None):
+        if mode not in (STORE_AND_FORWARD, CIRCUIT_SWITCHED):
+            raise ValueError(f'Unknown switching mode: {mode}')
+        self.system = system
+        self.mode = mode
+        self.bandwidth = bandwidth
+        self.setup = setup
+        self.duplex = duplex
+        self.record = record
+        self.routes = routes or Routes(system)
+        self._timelines = []
+        self._route_cache = {}
+        self._link_ids = {}
+        self._link_names = []
+        self._link_free = []
+        self._next_injection = math.inf
+        self._events = []
+        self._seq = 0
+        self._messages = 0
+
+    def _link(self, a, b):
+        if self.duplex or a < b:
+            return (a, b)
+        return (b, a)
+
+    def _link_id(self, a, b):
+        name = self._link(a, b)
+        link = self._link_ids.get(name)
+        if link is None:
+            link = self._link_ids[name] = len(self._link_names)
+            self._link_names.append(name)
+            self._link_free.append(0)
+            self._timelines.append([])
+        return link
+
+    def _route(self, source, target):
+        """``(processors, links, link ids)`` of the route, shared by all
+        messages between the two
+
+        A route is the one to the previous processor on the way plus a link.
+        """
+        route = self._route_cache.get((source, target))
+        if route is None:
+            if source == target:
+                route = ((source,), (), ())
+            else:
+                previous = self.routes.previous(source, target)
+                (path, links, link_ids) = self._route(source, previous)
+                link = self._link_id(previous, target)
+                route = (path + (target,), links + (self._link_names[link],),
+                         link_ids + (link,))
+            self._route_cache[source, target] = route
+        return route
+
+    @property
+    def timelines(self):
+        """``{link: [(start, end, message id)]}`` of links used so far"""
+        return {
+            self._link_names[link]: intervals
+            for (link, intervals) in enumerate(self._timelines) if intervals
+        }
+
+    def _push(self, time, kind, payload, hop=0):
+        self._seq += 1
+        heapq.heappush(self._events, (time, self._seq, kind, payload, hop))
+
+    def _message(self, source, target, size, ready, on_arrival=None):
+        self._messages += 1
+        return Message(self._messages, source, target, size, ready,
+                       *self._route(source, target), on_arrival)
+
+    def _inject(self, message):
+        if not message.links:
+            self._arrive(message, message.ready)
+        elif self.mode == STORE_AND_FORWARD:
+            self._hop(message.ready, message, 0)
+        else:
+            self._circuit(message.ready, message)
+
+    def send(self, source, target, size, ready, on_arrival=None):
+        message = self._message(source, target, size, ready, on_arrival)
+        if message.links:
+            self._push(ready, _INJECT, message)
+        else:
+            self._arrive(message, ready)
+        return message
+
+    def _arrive(self, message, time):
+        message.arrival = time
+        if message.on_arrival is not None:
+            message.on_arrival(message)
+
+    def _hop(self, time, message, hop):
+        link_ids = message.link_ids
+        link_free = self._link_free
+        events = self._events
+        duration = message.size / self.bandwidth
+        while hop < len(link_ids):
+            link = link_ids[hop]
+            start = link_free[link]
+            if start < time:
+                start = time
+            time = start + duration
+            link_free[link] = time
+            if self.record:
+                self._timelines[link].append((start, time, message.id))
+            hop += 1
+            if (events and events[0][0] <= time
+                    or self._next_injection <= time):
+                self._seq += 1
+                heapq.heappush(events, (time, self._seq, _HOP, message, hop))
+                return
+        self._arrive(message, time)
+
+    def _circuit(self, time, message):
+        link_ids = message.link_ids
+        link_free = self._link_free
+        start = max([time] + [link_free[link] for link in link_ids])
+        end = (start + message.size / self.bandwidth
+               + self.setup * len(link_ids))
+        for link in link_ids:
+            link_free[link] = end
+        if self.record:
+            for link in link_ids:
+                self._timelines[link].append((start, end, message.id))
+        self._arrive(message, end)
+
+    def run(self, on_task_done=None, injections=()):
+        """Processes events, ``injections`` are messages sorted by ready time
+
+        Injecting presorted messages lazily keeps the event heap as small as
+        the number of messages in flight.
+        """
+        # events and intervals hold no cycles, collections would only scan
+        # millions of them again and again
+        collect = gc.isenabled()
+        gc.disable()
+        try:
+            self._run(on_task_done, injections)
+        finally:
+            if collect:
+                gc.enable()
+
+    def _run(self, on_task_done, injections):
+        events = self._events
+        injections = iter(injections)
+        pending = next(injections, None)
+        while events or pending is not None:
+            if pending is not None and (
+                    not events or pending.ready <= events[0][0]):
+                message = pending
+                pending = next(injections, None)
+                self._next_injection = (math.inf if pending is None
+                                        else pending.ready)
+                self._inject(message)
+                continue
+            (time, _, kind, payload, hop) = heapq.heappop(events)
+            if kind == _HOP:
+                self._hop(time, payload, hop)
+            elif kind == _INJECT:
+                self._inject(payload)
+            else:
+                on_task_done(time, payload)
+
+    def simulate(self, messages):
+        """Transfers ``(source, target, size, ready)`` messages
+
+        Returns arrival times in order of ``messages``.
+        """
+        sent = [self._message(*message) for message in messages]
+        self.run(injections=sorted(sent, key=lambda m: (m.ready, m.id)))
+        return [message.arrival for message in sent]
+
+    def replay(self, schedule, tg):
+        """Re-times ``schedule`` of ``TaskGraph`` ``tg`` with link contention
+
+        Processor assignment and order of tasks on each processor are kept,
+        every task starts when its processor is free and all its inputs
+        have arrived.
+        """
+        g = tg.g
+        order = {
+            proc.id: [task_id for (_, _, task_id)
+                      in schedule.tasks_on(proc.id)]
+            for proc in self.system
+        }
+        position = {proc_id: 0 for proc_id in order}
+        proc_of = {
+            task_id: proc_id
+            for (task_id, (proc_id, _, _)) in schedule.assignments.items()
+        }
+        proc_free = {proc_id: 0 for proc_id in order}
+        busy = set()
+        inputs_left = {node.id: node.conns_in for node in g}
+        data_ready = {node.id: 0 for node in g}
+        result = Schedule()
+
+        def try_start(proc_id):
+            if proc_id in busy or position[proc_id] >= len(order[proc_id]):
+                return
+            task_id = order[proc_id][position[proc_id]]
+            if inputs_left[task_id] > 0:
+                return
+            task = g[task_id]
+            start = max(proc_free[proc_id], data_ready[task_id])
+            end = start + task.weight / self.system[proc_id].weight
+            result.assign(task_id, proc_id, start, end)
+            busy.add(proc_id)
+            self._push(end, _TASK_DONE, task_id)
+
+        def input_arrived(task_id, time):
+            inputs_left[task_id] -= 1
+            data_ready[task_id] = max(data_ready[task_id], time)
+            if inputs_left[task_id] == 0:
+                try_start(proc_of[task_id])
+
+        def on_task_done(time, task_id):
+            proc_id = proc_of[task_id]
+            busy.discard(proc_id)
+            proc_free[proc_id] = time
+            position[proc_id] += 1
+            for edge in g[task_id].connections_out:
+                target = edge.target.id
+                self.send(
+                    proc_id, proc_of[target], edge.weight, time,
+                    lambda m, target=target: input_arrived(target, m.arrival)
+                )
+            try_start(proc_id)
+
+        for proc_id in order:
+            try_start(proc_id)
+        self.run(on_task_done)
+        if len(result.assignments) != len(g):
+            raise ValueError('Schedule order contradicts task dependencies')
+        return result
+
+    def link_busy_time(self):
+        return {
+            link: sum(end - start for (start, end, _) in intervals)
+            for (link, intervals) in self.timelines.items()
+        }
+
+
+if __name__ == '__main__':
+    from reader import read_task_graph_file, read_system_graph_file
+    from scheduler import list_schedule
+    from task_graph import TaskGraph, ALGORITHMS
+    tg = TaskGraph(read_task_graph_file('examples/task_graph_2.dot'))
+    system = read_system_graph_file('examples/system_graph.dot')
+    for alg in ALGORITHMS:
+        schedule = list_schedule(tg, system, alg)
+        for mode in (STORE_AND_FORWARD, CIRCUIT_SWITCHED):
+            replayed = NetworkSimulator(system, mode).replay(schedule, tg)
+            print(f'{alg.__doc__}, {mode}: {schedule.makespan:g} -> '
+                  f'{replayed.makespan:g}')
@@ -0,0 +1,408 @@
+#!/usr/bin/env python
+
+import math
+import os
+import time
+
+from bounds import lower_bound
+from graph import topological_order
+from scheduler import Routes, Schedule, list_schedule, POLICIES
+from task_graph import ALGORITHMS, PATH_END
+
+
+_EPS = 1e-9
+
+
+class _Timeout(Exception):
+    pass
+
+
+class _Optimal(Exception):
+    pass
+
+
+class _Problem(object):
+    """Task graph and system flattened to lists indexed by position
+
+    Tasks are numbered in topological order, so predecessors of a task
+    always have lower numbers.
+    """
+    def __init__(self, tg, system):
+        order = topological_order(tg.g)
+        index = {node.id: ix for (ix, node) in enumerate(order)}
+        self.task_ids = [node.id for node in order]
+        self.weights = [node.weight for node in order]
+        self.preds = [
+            [(index[e.source.id], e.weight) for e in node.connections_in]
+            for node in order
+        ]
+        self.succs = [
+            [index[e.target.id] for e in node.connections_out]
+            for node in order
+        ]
+        self.proc_ids = [proc.id for proc in system]
+        self.perf = [proc.weight for proc in system]
+        routes = Routes(system)
+        self.hops = [[routes.hops(a, b) for b in self.proc_ids]
+                     for a in self.proc_ids]
+        self.duration = [[w / p for p in self.perf] for w in self.weights]
+        # every start and finish is a whole number, so are bounds
+        self.integral = all(
+            d == int(d) for durations in self.duration for d in durations
+        ) and all(cost == int(cost) for preds in self.preds
+                  for (_, cost) in preds)
+        fastest = max(self.perf)
+        path_end = tg.metric(PATH_END)
+        # time a task's successors need at least, and with the task itself
+        self.tail = [(path_end[node.id] - node.weight) / fastest
+                     for node in order]
+        self.path = [path_end[node.id] / fastest for node in order]
+        self.by_path = sorted(range(len(order)), key=lambda t: -self.path[t])
+        self.total_perf = sum(self.perf)
+        # empty processors of a complete system are interchangeable
+        m = len(self.perf)
+        complete = all(self.hops[a][b] == 1
+                       for a in range(m) for b in range(m) if a != b)
+        self.twin = [None] * m
+        if complete:
+            for p in range(m):
+                for q in range(p):
+                    if self.perf[q] == self.perf[p]:
+                        self.twin[p] = q
+                        break
+
+    def schedule(self, moves):
+        """Schedule of ``(task, processor)`` moves made in order"""
+        finish = {}
+        proc_of = {}
+        free = [0] * len(self.perf)
+        schedule = Schedule()
+        for (t, p) in moves:
+            start = free[p]
+            for (u, cost) in self.preds[t]:
+                ready = finish[u]
+                if proc_of[u] != p:
+                    ready += cost * self.hops[proc_of[u]][p]
+                start = max(start, ready)
+            finish[t] = start + self.duration[t][p]
+            proc_of[t] = p
+            free[p] = finish[t]
+            schedule.assign(self.task_ids[t], self.proc_ids[p], start,
+                            finish[t])
+        return schedule
+
+
+class _Search(object):
+    """Depth-first branch and bound over partial schedules
+
+    Tasks are appended to processors in order of ``(start, task)``, every
+    schedule without needless idle time is reached exactly this way.
+    """
+    def __init__(self, problem, best, floor=0, deadline=None, shared=None,
+                 table_size=1 << 20):
+        self.problem = problem
+        self.best = best
+        self.floor = floor
+        self.best_moves = None
+        self.deadline = deadline
+        self.shared = shared
+        self.table_size = table_size
+        self.table = {}
+        self.nodes = 0
+        n = len(problem.weights)
+        m = len(problem.perf)
+        self.proc_of = [-1] * n
+        self.finish = [0] * n
+        self.waiting = [len(preds) for preds in problem.preds]
+        self.ready = [t for t in range(n) if not problem.preds[t]]
+        self.free = [0] * m
+        self.loads = [0] * m
+        self.mask = 0
+        self.last = (-1, -1)
+        self.makespan = 0
+        self.remaining = sum(problem.weights)
+        self.moves = []
+
+    def _start(self, t, p):
+        problem = self.problem
+        start = self.free[p]
+        for (u, cost) in problem.preds[t]:
+            ready = self.finish[u]
+            if self.proc_of[u] != p:
+                ready += cost * problem.hops[self.proc_of[u]][p]
+            if ready > start:
+                start = ready
+        return start
+
+    def moves_from_here(self):
+        """Moves allowed in the current state, as ``(bound, t, p, start)``
+
+        Sorted by bound, only the ones that may beat the best are kept.
+        """
+        problem = self.problem
+        (longest, second) = (None, None)
+        for t in problem.by_path:
+            if self.proc_of[t] == -1:
+                if longest is None:
+                    longest = t
+                else:
+                    second = t
+                    break
+        moves = []
+        for t in self.ready:
+            others = second if t == longest else longest
+            rest = problem.path[others] if others is not None else 0
+            for p in range(len(problem.perf)):
+                twin = problem.twin[p]
+                if twin is not None and not self.loads[p] \
+                        and not self.loads[twin]:
+                    continue
+                start = self._start(t, p)
+                if (start, t) <= self.last:
+                    continue
+                end = start + problem.duration[t][p]
+                bound = max(self.makespan, end + problem.tail[t],
+                            start + rest)
+                if problem.integral:
+                    bound = math.ceil(bound - _EPS)
+                if bound < self.best - _EPS:
+                    moves.append((bound, t, p, start))
+        moves.sort()
+        return moves
+
+    def apply(self, t, p, start):
+        problem = self.problem
+        end = start + problem.duration[t][p]
+        undo = (self.free[p], self.last, self.makespan)
+        self.proc_of[t] = p
+        self.finish[t] = end
+        self.free[p] = end
+        self.loads[p] += 1
+        self.mask |= 1 << t
+        self.last = (start, t)
+        self.makespan = max(self.makespan, end)
+        self.remaining -= problem.weights[t]
+        self.ready.remove(t)
+        for s in problem.succs[t]:
+            self.waiting[s] -= 1
+            if self.waiting[s] == 0:
+                self.ready.append(s)
+        self.moves.append((t, p))
+        return undo
+
+    def undo(self, t, p, undo):
+        problem = self.problem
+        self.moves.pop()
+        for s in problem.succs[t]:
+            if self.waiting[s] == 0:
+                self.ready.remove(s)
+            self.waiting[s] += 1
+        self.ready.append(t)
+        self.remaining += problem.weights[t]
+        self.mask &= ~(1 << t)
+        self.loads[p] -= 1
+        self.proc_of[t] = -1
+        (self.free[p], self.last, self.makespan) = undo
+
+    def _capacity_bound(self, start):
+        """Remaining work can not start before ``start`` on any processor"""
+        perf = self.problem.perf
+        busy = sum(perf[p] * max(free, start)
+                   for (p, free) in enumerate(self.free))
+        bound = (self.remaining + busy) / self.problem.total_perf
+        if self.problem.integral:
+            bound = math.ceil(bound - _EPS)
+        return bound
+
+    def _seen(self):
+        """Whether an equal state with no larger makespan was searched"""
+        problem = self.problem
+        frontier = tuple(
+            (t, self.proc_of[t], self.finish[t])
+            for t in range(len(problem.weights))
+            if self.proc_of[t] != -1
+            and any(self.proc_of[s] == -1 for s in problem.succs[t])
+        )
+        key = (self.mask, self.last, tuple(self.free), frontier)
+        known = self.table.get(key)
+        if known is not None and known <= self.makespan:
+            return True
+        if len(self.table) >= self.table_size:
+            self.table.clear()
+        self.table[key] = self.makespan
+        return False
+
+    def _improve(self):
+        self.best = self.makespan
+        self.best_moves = list(self.moves)
+        if self.shared is not None:
+            with self.shared.get_lock():
+                if self.best < self.shared.value:
+                    self.shared.value = self.best
+        if self.best <= self.floor + _EPS:
+            raise _Optimal()
+
+    def _tick(self):
+        if self.deadline is not None and time.time() > self.deadline:
+            raise _Timeout()
+        if self.shared is not None and self.shared.value < self.best:
+            self.best = self.shared.value
+            if self.best <= self.floor + _EPS:
+                raise _Optimal()
+
+    def search(self):
+        """Searches from the current state, ``False`` on the time limit
+
+        Stops as soon as a schedule as short as ``floor`` is found.
+        """
+        if self.best <= self.floor + _EPS:
+            return True
+        try:
+            self._search()
+        except (_Timeout, _Optimal) as e:
+            return isinstance(e, _Optimal)
+        return True
+
+    def _search(self):
+        self.nodes += 1
+        if self.nodes & 1023 == 0:
+            self._tick()
+        if not self.ready:
+            if self.makespan < self.best - _EPS:
+                self._improve()
+            return
+        for (bound, t, p, start) in self.moves_from_here():
+            if bound >= self.best - _EPS:
+                break
+            undo = self.apply(t, p, start)
+            if self._capacity_bound(start) < self.best - _EPS \
+                    and not self._seen():
+                self._search()
+            self.undo(t, p, undo)
+
+
+_shared = {}
+
+
+def _share(problem, incumbent, floor, deadline):
+    _shared['problem'] = problem
+    _shared['incumbent'] = incumbent
+    _shared['floor'] = floor
+    _shared['deadline'] = deadline
+
+
+def _replay(search, prefix):
+    for (t, p) in prefix:
+        search.apply(t, p, search._start(t, p))
+
+
+def _solve(prefix):
+    problem = _shared['problem']
+    incumbent = _shared['incumbent']
+    search = _Search(problem, incumbent.value, _shared['floor'],
+                     _shared['deadline'], incumbent)
+    _replay(search, prefix)
+    done = search.search()
+    return (search.best_moves, done, search.nodes)
+
+
+def _split(problem, best, count):
+    """Prefixes of moves covering the search tree, at least ``count``"""
+    prefixes = [[]]
+    while len(prefixes) < count:
+        expanded = []
+        for prefix in prefixes:
+            search = _Search(problem, best)
+            _replay(search, prefix)
+            if not search.ready:
+                expanded.append(prefix)
+                continue
+            expanded.extend(
+                prefix + [(t, p)]
+                for (_, t, p, _) in search.moves_from_here()
+            )
+        if len(expanded) <= len(prefixes):
+            return expanded
+        prefixes = expanded
+    return prefixes
+
+
+def _solve_pool(prefixes, jobs, problem, incumbent, floor, deadline):
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(jobs, mp_context=context) as executor:
+            return list(executor.map(_solve, prefixes))
+    with ProcessPoolExecutor(jobs, initializer=_share,
+                             initargs=(problem, incumbent, floor,
+                                       deadline)) as executor:
+        return list(executor.map(_solve, prefixes))
+
+
+def optimal_schedule(tg, system, time_limit=None, jobs=None):
+    """Shortest schedule of ``TaskGraph`` ``tg``, returns ``(schedule, exact)``
+
+    Starts from the best heuristic schedule and searches for shorter ones
+    with branch and bound, until one reaches ``bounds.lower_bound``. The
+    search tree is split into subtrees solved in a process pool, the best
+    makespan is shared between workers. When
+    ``time_limit`` seconds pass, the best schedule found so far is returned
+    with ``exact`` set to ``False``.
+    """
+    from multiprocessing import Value
+
+    deadline = None if time_limit is None else time.time() + time_limit
+    problem = _Problem(tg, system)
+    routes = Routes(system)
+    heuristic = min(
+        (list_schedule(tg, system, alg, policy, routes)
+         for alg in ALGORITHMS for policy in POLICIES),
+        key=lambda schedule: schedule.makespan,
+    )
+    floor = lower_bound([tg], [system])[0, 0]
+    if problem.integral:
+        floor = math.ceil(floor - _EPS)
+    incumbent = Value('d', heuristic.makespan)
+    jobs = jobs or os.cpu_count()
+    if jobs == 1:
+        search = _Search(problem, incumbent.value, floor, deadline)
+        done = search.search()
+        results = [(search.best_moves, done, search.nodes)]
+    else:
+        prefixes = _split(problem, incumbent.value, jobs * 4)
+        _share(problem, incumbent, floor, deadline)
+        results = _solve_pool(prefixes, jobs, problem, incumbent, floor,
+                              deadline)
+    best = heuristic
+    for (moves, _, _) in results:
+        if moves is not None:
+            schedule = problem.schedule(moves)
+            if schedule.makespan < best.makespan:
+                best = schedule
+    return (best, all(done for (_, done, _) in results))
+
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser
+
+    from reader import read_task_graph_file, read_system_graph_file
+    from task_graph import TaskGraph
+
+    ap = ArgumentParser(description='Find the shortest schedule of a small '
+                                    'task graph')
+    ap.add_argument('tasks', help='Task graph file')
+    ap.add_argument('system', help='System graph file')
+    ap.add_argument('--time-limit', '-t', type=float,
+                    help='Return the best schedule found in given seconds')
+    ap.add_argument('--jobs', '-j', type=int,
+                    help='Number of worker processes, defaults to CPU count')
+    opts = ap.parse_args()
+    tg = TaskGraph(read_task_graph_file(opts.tasks))
+    system = read_system_graph_file(opts.system)
+    (schedule, exact) = optimal_schedule(tg, system, opts.time_limit,
+                                         opts.jobs)
+    print(f'Makespan: {schedule.makespan:g}'
+          + ('' if exact else ' (time limit reached)'))
+    print(schedule)
@@ -1,62 +1,207 @@
-import dot_parser
+import hashlib
+import os
+
+import dot_stream
+from cache import default_cache, ResultCache
+from dot_stream import NODE, EDGE, ATTR, UnsupportedSyntax
 from graph import Graph as TaskGraph
+from layout import layout_fingerprint
 from system_graph import Graph as SystemGraph
 
 
-def read_task_graph_file(filename):
-    with open(filename, 'r') as source:
-        content = source.read()
-    return read_task_graph(content)
-
-
-def read_system_graph_file(filename):
-    with open(filename, 'r') as source:
-        content = source.read()
-    return read_system_graph(content)
-
-
-def read_task_graph(content):
-    definitions = dot_parser.parse_dot_data(content)
-    graph = definitions[0]
-    g = TaskGraph()
-    ids_mapping = {}
-    for (ix, node) in enumerate(graph.get_nodes(), 1):
+def read_task_graph_file(filename, with_positions=False, use_mmap=False,
+                         offset=0):
+    return _load_file(TaskGraph, filename, with_positions, use_mmap, offset)
+
+
+def read_system_graph_file(filename, with_positions=False, use_mmap=False,
+                           offset=0):
+    return _load_file(SystemGraph, filename, with_positions, use_mmap, offset)
+
+
+def read_task_graph(content, with_positions=False):
+    return _load(TaskGraph, content, with_positions)
+
+
+def read_system_graph(content, with_positions=False):
+    return _load(SystemGraph, content, with_positions)
+
+
+def iter_task_graphs_file(filename, with_positions=False, use_mmap=False):
+    return _iter_file(TaskGraph, filename, with_positions, use_mmap)
+
+
+def iter_system_graphs_file(filename, with_positions=False, use_mmap=False):
+    return _iter_file(SystemGraph, filename, with_positions, use_mmap)
+
+
+def graph_index(filename, store=False):
+    """Byte offsets of graphs in a file, for ``offset`` of read functions
+
+    With ``store`` the index is kept in ``.idx`` file next to it and reused
+    while size and modification time of the file stay the same.
+    """
+    index_name = filename + '.idx'
+    stat = os.stat(filename)
+    version = f'{stat.st_size} {stat.st_mtime_ns}'
+    if store and os.path.exists(index_name):
+        with open(index_name, 'r') as index:
+            lines = index.read().splitlines()
+        if lines and lines[0] == version:
+            return [int(line) for line in lines[1:]]
+    with open(filename, 'rb') as source:
+        offsets = list(dot_stream.graph_offsets(source))
+    if store:
+        with open(index_name, 'w') as index:
+            index.writelines(f'{line}\n' for line in [version] + offsets)
+    return offsets
+
+
+def _load_file(graph_class, filename, with_positions, use_mmap, offset):
+    """Streams statements of the graph at ``offset`` right into the graph
+
+    Files that are not in the dialect written by ``save`` are handed to
+    ``dot_parser``, as are all files when results are cached. Only the text
+    of that graph is read then, and it is what the cache is keyed on.
+    """
+    with open(filename, 'rb') as source:
+        if default_cache() is None:
+            source.seek(offset)
+            try:
+                return _build(
+                    graph_class,
+                    dot_stream.statements(dot_stream.lines(source, use_mmap)),
+                    with_positions,
+                )
+            except UnsupportedSyntax:
+                pass
+        content = _graph_content(source, offset)
+    return _load(graph_class, content, with_positions)
+
+
+def _graph_content(source, offset):
+    """Text of the graph at ``offset``, up to the header of the next one"""
+    source.seek(offset)
+    headers = dot_stream.graph_offsets(dot_stream.lines(source))
+    next(headers, None)
+    end = next(headers, None)
+    source.seek(offset)
+    return source.read(end).decode()
+
+
+def _iter_file(graph_class, filename, with_positions, use_mmap):
+    """Yields every graph of a file, one at a time"""
+    offset = 0
+    with open(filename, 'rb') as source:
+        try:
+            for (offset, statements) in dot_stream.graphs(
+                    dot_stream.lines(source, use_mmap)):
+                yield _build(graph_class, statements, with_positions)
+            return
+        except UnsupportedSyntax:
+            source.seek(offset)
+            content = source.read().decode()
+    for graph in _parse_dot(content):
+        yield _build(graph_class, _statements_of(graph), with_positions)
+
+
+def _load(graph_class, content, with_positions):
+    """Builds graph out of DOT ``content``, parsed once per cache"""
+    cache = default_cache()
+    if cache is None:
+        return _build(graph_class, _parse(content), with_positions)
+    digest = hashlib.blake2b(content.encode(), digest_size=16)
+    parsed = cache.get_or_compute(
+        ResultCache.key('dot', digest.hexdigest()),
+        lambda: _parse(content),
+    )
+    return _build(graph_class, parsed, with_positions)
+
+
+def _parse(content):
+    """Statements of the first graph in DOT ``content``, as a list"""
+    try:
+        return list(dot_stream.statements(content.encode().splitlines()))
+    except UnsupportedSyntax:
+        pass
+    return _statements_of(_parse_dot(content)[0])
+
+
+def _parse_dot(content):
+    # pyparsing takes longer to import than the rest of the package
+    import dot_parser
+    return dot_parser.parse_dot_data(content)
+
+
+def _statements_of(graph):
+    """Statements of a graph parsed by ``dot_parser``"""
+    parsed = []
+    fingerprint = graph.get('fingerprint')
+    if fingerprint is not None:
+        parsed.append((ATTR, 'fingerprint', fingerprint.strip('"')))
+    for node in graph.get_nodes():
+        # default attributes, as in ``node [label="\N"]`` of graphviz
+        if node.get_name() in ('graph', 'node', 'edge'):
+            continue
         id_ = int(node.get_name()[len('Node_'):])
         weight = int(node.get_label()[len(f'"{id_} ('):-2])
-        ids_mapping[id_] = ix
-        g.add_node(weight)
-
+        pos = node.get_pos()
+        parsed.append((NODE, id_, weight, pos and pos.strip('"')))
     for edge in graph.get_edges():
-        source_id = int(edge.get_source()[len('Node_'):])
-        target_id = int(edge.get_destination()[len('Node_'):])
-        weight = int(edge.get_label()[1:-1])
-        g.connect(source_id, target_id, weight)
-
-    return g
-
-
-def read_system_graph(content):
-    definitions = dot_parser.parse_dot_data(content)
-    graph = definitions[0]
-    g = SystemGraph()
+        label = edge.get_label()
+        parsed.append((
+            EDGE,
+            int(edge.get_source()[len('Node_'):]),
+            int(edge.get_destination()[len('Node_'):]),
+            label and int(label.strip('"')),
+        ))
+    return parsed
+
+
+def _build(graph_class, statements, with_positions):
+    weighted = graph_class is TaskGraph
+    g = graph_class()
     ids_mapping = {}
-    for (ix, node) in enumerate(graph.get_nodes(), 1):
-        id_ = int(node.get_name()[len('Node_'):])
-        weight = int(node.get_label()[len(f'"{id_} ('):-2])
-        ids_mapping[id_] = ix
-        g.add_node(weight)
+    positions = {}
+    fingerprint = None
+    for statement in statements:
+        if statement[0] == EDGE:
+            (_, source_id, target_id, weight) = statement
+            if weighted:
+                g.connect(ids_mapping[source_id], ids_mapping[target_id],
+                          weight)
+            else:
+                g.connect(ids_mapping[source_id], ids_mapping[target_id])
+        elif statement[0] == NODE:
+            (_, id_, weight, pos) = statement
+            ids_mapping[id_] = g.add_node(weight)
+            if with_positions:
+                positions[ids_mapping[id_]] = pos
+        elif statement[1] == 'fingerprint':
+            fingerprint = statement[2]
+
+    if with_positions:
+        return (g, _read_positions(g, positions, fingerprint))
+    return g
 
-    for edge in graph.get_edges():
-        source_id = int(edge.get_source()[len('Node_'):])
-        target_id = int(edge.get_destination()[len('Node_'):])
-        g.connect(source_id, target_id)
 
-    return g
+def _read_positions(g, positions, fingerprint):
+    if fingerprint is None or fingerprint != layout_fingerprint(g):
+        return None
+    if None in positions.values():
+        return None
+    return {
+        node_id: tuple(map(float, pos.split(',')))
+        for (node_id, pos) in positions.items()
+    }
 
 
-def save(graph, filename):
+def save(graph, filename, positions=None):
+    fingerprint = None
+    if positions is not None:
+        fingerprint = layout_fingerprint(graph)
     with open(filename, 'w') as file_:
-        file_.write(str(graph))
+        file_.write(graph.to_dot(positions, fingerprint))
 
 
 if __name__ == '__main__':
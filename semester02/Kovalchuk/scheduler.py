@@ -0,0 +1,300 @@
+import heapq
+import os
+
+from collections import deque
+from functools import partial
+
+from cache import cached
+from task_graph import ALGORITHMS, TaskGraph
+
+
+class Routes(object):
+    """Shortest routes between processors of a system graph
+
+    BFS trees are built lazily, one per source processor.
+    """
+    def __init__(self, system):
+        self.system = system
+        self._parents = {}
+
+    def _tree(self, source):
+        tree = self._parents.get(source)
+        if tree is None:
+            tree = {source: None}
+            todo = deque([source])
+            while todo:
+                node = self.system[todo.popleft()]
+                for edge in node.connections_out:
+                    if edge.target.id not in tree:
+                        tree[edge.target.id] = node.id
+                        todo.append(edge.target.id)
+            self._parents[source] = tree
+        return tree
+
+    def previous(self, source, target):
+        """Processor right before ``target`` on the route from ``source``"""
+        tree = self._tree(source)
+        if target not in tree:
+            raise ValueError(f'Processor {target} is unreachable '
+                             f'from {source}')
+        return tree[target]
+
+    def path(self, source, target):
+        tree = self._tree(source)
+        if target not in tree:
+            raise ValueError(f'Processor {target} is unreachable '
+                             f'from {source}')
+        path = [target]
+        while tree[path[-1]] is not None:
+            path.append(tree[path[-1]])
+        path.reverse()
+        return path
+
+    def build_all(self):
+        for proc in self.system:
+            self._tree(proc.id)
+
+    def hops(self, source, target):
+        if source == target:
+            return 0
+        return len(self.path(source, target)) - 1
+
+
+class Schedule(object):
+    def __init__(self):
+        self.assignments = {}
+
+    def assign(self, task_id, processor_id, start, end):
+        self.assignments[task_id] = (processor_id, start, end)
+
+    @property
+    def makespan(self):
+        return max((end for (_, _, end) in self.assignments.values()),
+                   default=0)
+
+    def tasks_on(self, processor_id):
+        return sorted(
+            (start, end, task_id)
+            for (task_id, (proc, start, end)) in self.assignments.items()
+            if proc == processor_id
+        )
+
+    def __str__(self):
+        return '\n'.join(
+            f'Node_{task_id}: P{proc} [{start:g}, {end:g})'
+            for (task_id, (proc, start, end))
+            in sorted(self.assignments.items(), key=lambda x: x[1][1])
+        )
+
+
+class _State(object):
+    def __init__(self, system, routes):
+        self.system = system
+        self.routes = routes
+        self.schedule = Schedule()
+        self.free = {proc.id: 0 for proc in system}
+
+    def duration(self, task, proc_id):
+        return task.weight / self.system[proc_id].weight
+
+    def data_ready(self, task, proc_id):
+        ready = 0
+        assignments = self.schedule.assignments
+        for edge in task.connections_in:
+            (src_proc, _, end) = assignments[edge.source.id]
+            if src_proc != proc_id:
+                end += edge.weight * self.routes.hops(src_proc, proc_id)
+            ready = max(ready, end)
+        return ready
+
+    def start_time(self, task, proc_id):
+        return max(self.free[proc_id], self.data_ready(task, proc_id))
+
+
+def policy_earliest_finish(state, task):
+    """Earliest finish"""
+    return min(
+        state.free,
+        key=lambda p: (state.start_time(task, p) + state.duration(task, p), p)
+    )
+
+
+def policy_earliest_start(state, task):
+    """Earliest start"""
+    return min(state.free, key=lambda p: (state.start_time(task, p), p))
+
+
+def policy_first_free(state, task):
+    """First free processor"""
+    return min(
+        state.free,
+        key=lambda p: (state.free[p], -state.system[p].weight, p)
+    )
+
+
+POLICIES = (
+    policy_earliest_finish,
+    policy_earliest_start,
+    policy_first_free,
+)
+
+
+def list_schedule(tg, system, alg, policy=policy_earliest_finish,
+                  routes=None):
+    """Schedules ``TaskGraph`` ``tg`` on ``system`` in ``alg`` queue order
+
+    A task runs ``weight / performance`` on a processor, a transfer between
+    different processors takes ``edge weight * hops``. Out of the ready
+    tasks the one with the highest priority is scheduled next.
+    """
+    state = _State(system, routes or Routes(system))
+    rank = {
+        node.id: ix for (ix, (node, _)) in enumerate(tg.prioritize_nodes(alg))
+    }
+    waiting = {node.id: node.conns_in for node in tg.g}
+    ready = [(rank[node.id], node.id) for node in tg.g if node.conns_in == 0]
+    heapq.heapify(ready)
+    while ready:
+        (_, task_id) = heapq.heappop(ready)
+        task = tg.g[task_id]
+        proc_id = policy(state, task)
+        start = state.start_time(task, proc_id)
+        end = start + state.duration(task, proc_id)
+        state.schedule.assign(task_id, proc_id, start, end)
+        state.free[proc_id] = end
+        for edge in task.connections_out:
+            waiting[edge.target.id] -= 1
+            if waiting[edge.target.id] == 0:
+                heapq.heappush(ready, (rank[edge.target.id], edge.target.id))
+    if len(state.schedule.assignments) != len(tg.g):
+        raise ValueError('Task graph is not acyclic')
+    return state.schedule
+
+
+_shared = {}
+
+
+def _share(tg, system, routes):
+    _shared['tg'] = tg
+    _shared['system'] = system
+    _shared['routes'] = routes
+
+
+def _attach(tasks, system):
+    system = system.graph()
+    _share(TaskGraph(tasks.graph()), system, Routes(system))
+
+
+def _evaluate(candidate):
+    (alg, policy) = candidate
+    schedule = list_schedule(_shared['tg'], _shared['system'], alg, policy,
+                             _shared['routes'])
+    return schedule
+
+
+def _evaluate_pool(candidates, jobs, tg, system, routes):
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(jobs, mp_context=context) as executor:
+            return list(executor.map(_evaluate, candidates))
+    if tg.g.frozen and system.frozen:
+        from shared_graph import SharedGraph
+        with SharedGraph.export(tg.g) as tasks, \
+                SharedGraph.export(system) as processors, \
+                ProcessPoolExecutor(jobs, initializer=_attach,
+                                    initargs=(tasks, processors)) as executor:
+            return list(executor.map(_evaluate, candidates))
+    with ProcessPoolExecutor(jobs, initializer=_share,
+                             initargs=(tg, system, routes)) as executor:
+        return list(executor.map(_evaluate, candidates))
+
+
+def portfolio(tg, system, algorithms=ALGORITHMS, policies=POLICIES,
+              jobs=None):
+    """Runs every priority algorithm with every assignment policy
+
+    Candidates are evaluated in a process pool. Workers inherit the task
+    graph with its metrics and the processor routes when processes are
+    forked. Otherwise frozen graphs are passed through shared memory, and
+    others are copied to every worker once at start. Returns the best
+    schedule and ``(alg, policy, makespan)`` rows ordered by makespan,
+    both are kept in the default result cache.
+    """
+    algorithms = {alg.__name__: alg for alg in algorithms}
+    policies = {policy.__name__: policy for policy in policies}
+    (assignments, table) = cached(
+        ':'.join(['portfolio'] + list(algorithms) + list(policies)),
+        [tg.g, system],
+        partial(_portfolio, tg, system, algorithms, policies, jobs),
+    )
+    best = Schedule()
+    for (task_id, proc, start, end) in assignments:
+        best.assign(task_id, proc, start, end)
+    table = [
+        (algorithms[alg], policies[policy], makespan)
+        for (alg, policy, makespan) in table
+    ]
+    return (best, table)
+
+
+def _portfolio(tg, system, algorithms, policies, jobs):
+    tg.compute()
+    routes = Routes(system)
+    routes.build_all()
+    candidates = [(alg, policy)
+                  for alg in algorithms.values()
+                  for policy in policies.values()]
+    jobs = min(jobs or os.cpu_count(), len(candidates))
+    _share(tg, system, routes)
+    if jobs == 1:
+        schedules = list(map(_evaluate, candidates))
+    else:
+        schedules = _evaluate_pool(candidates, jobs, tg, system, routes)
+    table = sorted(
+        (
+            (alg.__name__, policy.__name__, schedule.makespan)
+            for ((alg, policy), schedule) in zip(candidates, schedules)
+        ),
+        key=lambda row: row[2],
+    )
+    best = min(schedules, key=lambda schedule: schedule.makespan)
+    assignments = [
+        (task_id, proc, start, end)
+        for (task_id, (proc, start, end)) in best.assignments.items()
+    ]
+    return (assignments, table)
+
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser
+
+    from reader import read_task_graph_file, read_system_graph_file
+    from task_graph import TaskGraph
+
+    ap = ArgumentParser(description='Schedule task graph with every '
+                                    'algorithm and assignment policy')
+    ap.add_argument('tasks', help='Task graph file')
+    ap.add_argument('system', help='System graph file')
+    ap.add_argument('--jobs', '-j', type=int,
+                    help='Number of worker processes, defaults to CPU count')
+    ap.add_argument('--coarsen', choices=['chains', 'edges'],
+                    help='Schedule clusters of tasks instead of tasks')
+    opts = ap.parse_args()
+    g = read_task_graph_file(opts.tasks)
+    system = read_system_graph_file(opts.system)
+    if opts.coarsen is not None:
+        from transforms import collapse_chains, zero_edges
+        coarsen = collapse_chains if opts.coarsen == 'chains' else zero_edges
+        clustering = coarsen(g)
+        (best, table) = portfolio(TaskGraph(clustering.graph), system,
+                                  jobs=opts.jobs)
+        best = clustering.expand_schedule(best, g)
+    else:
+        (best, table) = portfolio(TaskGraph(g), system, jobs=opts.jobs)
+    for (alg, policy, makespan) in table:
+        print(f'{alg.__doc__:<16}{policy.__doc__:<24}{makespan:g}')
+    print()
+    print(best)
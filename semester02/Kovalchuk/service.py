@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+
+import asyncio
+import hashlib
+import json
+import os
+
+from collections import OrderedDict
+from functools import partial
+
+from batch import analyse_content
+
+
+REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    500: 'Internal Server Error',
+}
+
+
+class LRU(object):
+    def __init__(self, size):
+        self.size = size
+        self._items = OrderedDict()
+
+    def get(self, key):
+        value = self._items.get(key)
+        if value is not None:
+            self._items.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.size:
+            self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+
+def _analyse_batch(items):
+    return [analyse_content(content, reduce) for (content, reduce) in items]
+
+
+class Batcher(object):
+    """Collects submitted items and runs ``fn`` on batches in ``executor``
+
+    A batch is dispatched when it has ``size`` items or ``delay`` seconds
+    after its first item arrived. It is split into up to ``jobs`` chunks,
+    one executor job each, so a burst keeps every worker busy.
+    """
+    def __init__(self, loop, executor, fn, size=64, delay=0.005, jobs=1):
+        self._loop = loop
+        self._executor = executor
+        self._fn = fn
+        self._size = size
+        self._delay = delay
+        self._jobs = jobs
+        self._pending = []
+        self._timer = None
+
+    def submit(self, item):
+        future = self._loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self._size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = self._loop.call_later(self._delay, self._flush)
+        return future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        (batch, self._pending) = (self._pending, [])
+        chunk = -(-len(batch) // self._jobs)
+        for start in range(0, len(batch), chunk):
+            part = batch[start:start + chunk]
+            try:
+                job = self._loop.run_in_executor(
+                    self._executor, self._fn, [item for (item, _) in part]
+                )
+            except Exception as e:
+                # a broken pool refuses jobs right away
+                job = self._loop.create_future()
+                job.set_exception(e)
+            job.add_done_callback(partial(self._done, part))
+
+    @staticmethod
+    def _done(batch, job):
+        error = job.exception()
+        results = job.result() if error is None else [None] * len(batch)
+        for ((_, future), result) in zip(batch, results):
+            if future.cancelled():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+class AnalysisService(object):
+    """HTTP/JSON front end of ``batch.analyse_content``
+
+    ``POST /analyse`` takes ``{"graph": "<DOT>"}`` or ``{"hash": "<content
+    hash>"}`` of a graph sent before, with optional ``"reduce": true``, and
+    answers with the batch analysis record. Records and graphs are kept in
+    in-memory LRUs, equal requests in flight share one computation.
+    """
+    def __init__(self, loop, executor, cache_size=1024, batch_size=64,
+                 batch_delay=0.005, jobs=1):
+        self._batcher = Batcher(loop, executor, _analyse_batch, batch_size,
+                                batch_delay, jobs)
+        self._records = LRU(cache_size)
+        self._graphs = LRU(cache_size)
+        self._in_flight = {}
+
+    async def analyse(self, content, reduce=False):
+        digest = hashlib.blake2b(content.encode(), digest_size=16)
+        key = (digest.hexdigest(), reduce)
+        record = self._records.get(key)
+        if record is not None:
+            return record
+        future = self._in_flight.get(key)
+        if future is None:
+            future = self._batcher.submit((content, reduce))
+            self._in_flight[key] = future
+            future.add_done_callback(
+                lambda _: self._in_flight.pop(key, None)
+            )
+        record = await asyncio.shield(future)
+        self._records.put(key, record)
+        if record.get('hash') is not None:
+            self._graphs.put(record['hash'], content)
+        return record
+
+    async def dispatch(self, method, path, body):
+        if path == '/health':
+            return (200, {'status': 'ok', 'records': len(self._records),
+                          'graphs': len(self._graphs)})
+        if path != '/analyse':
+            return (404, {'error': f'Unknown path: {path}'})
+        if method != 'POST':
+            return (405, {'error': 'Use POST'})
+        try:
+            request = json.loads(body)
+        except ValueError as e:
+            return (400, {'error': f'Invalid JSON: {e}'})
+        if not isinstance(request, dict):
+            return (400, {'error': 'Expected JSON object'})
+        content = request.get('graph')
+        if content is None and 'hash' in request:
+            content = self._graphs.get(request['hash'])
+            if content is None:
+                return (404, {'error': 'Unknown graph hash'})
+        if not isinstance(content, str):
+            return (400, {'error': 'Expected "graph" or "hash"'})
+        record = await self.analyse(content, bool(request.get('reduce')))
+        return (200, record)
+
+    async def handle(self, reader, writer):
+        """Serves HTTP/1.1 requests of one connection, with keep-alive"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                request_line = request_line.decode('latin-1')
+                (method, path, _) = request_line.split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    (name, _, value) = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                body = await reader.readexactly(length)
+                try:
+                    (status, payload) = await self.dispatch(method, path,
+                                                            body)
+                except Exception as e:
+                    (status, payload) = (500, {'error': repr(e)})
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f'HTTP/1.1 {status} {REASONS[status]}\r\n'
+                    f'Content-Type: application/json\r\n'
+                    f'Content-Length: {len(data)}\r\n\r\n'.encode() + data
+                )
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser
+    from concurrent.futures import ProcessPoolExecutor
+
+    ap = ArgumentParser(description='Serve graph analysis over HTTP/JSON')
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=8765)
+    ap.add_argument('--unix', help='Listen on Unix socket instead')
+    ap.add_argument('--jobs', '-j', type=int,
+                    help='Number of worker processes, defaults to CPU count')
+    ap.add_argument('--batch-size', type=int, default=64,
+                    help='Max number of graphs sent to a worker at once')
+    ap.add_argument('--batch-delay', type=float, default=5,
+                    help='Max time a graph waits for its batch, in ms')
+    ap.add_argument('--cache-size', type=int, default=1024,
+                    help='Number of graphs and records kept in memory')
+    opts = ap.parse_args()
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    jobs = opts.jobs or os.cpu_count()
+    with ProcessPoolExecutor(jobs) as executor:
+        service = AnalysisService(loop, executor, opts.cache_size,
+                                  opts.batch_size, opts.batch_delay / 1000,
+                                  jobs)
+        if opts.unix is not None:
+            server = asyncio.start_unix_server(service.handle, opts.unix)
+        else:
+            server = asyncio.start_server(service.handle, opts.host,
+                                          opts.port)
+        server = loop.run_until_complete(server)
+        try:
+            loop.run_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+            loop.run_until_complete(server.wait_closed())
+            loop.close()
@@ -0,0 +1,113 @@
+from array import array
+
+from graph import Graph as TaskGraph
+from system_graph import Graph as SystemGraph
+
+
+# blocks and graphs attached by this process, by block name
+_blocks = {}
+_graphs = {}
+
+
+class SharedGraph(object):
+    """Handle of a frozen graph exported to shared memory as flat arrays
+
+    The block holds ``int64`` node ids and weights, then edge sources,
+    targets (as node positions) and weights. A system graph keeps one edge
+    of every link. Handles are cheap to pickle, so they may be passed to
+    worker processes instead of graphs. The process that exported the graph
+    owns the block and removes it on ``close``.
+    """
+    def __init__(self, name, system, nodes, edges):
+        self.name = name
+        self.system = system
+        self.nodes = nodes
+        self.edges = edges
+        self._memory = None
+
+    def __getstate__(self):
+        return (self.name, self.system, self.nodes, self.edges)
+
+    def __setstate__(self, state):
+        (self.name, self.system, self.nodes, self.edges) = state
+        self._memory = None
+
+    @classmethod
+    def export(cls, graph):
+        from multiprocessing.shared_memory import SharedMemory
+
+        if not graph.frozen:
+            raise ValueError('Only frozen graphs can be shared')
+        system = isinstance(graph, SystemGraph)
+        nodes = list(graph)
+        position = {node.id: ix for (ix, node) in enumerate(nodes)}
+        edges = [
+            edge for node in nodes for edge in node.connections_out
+            if not system or edge.source.id < edge.target.id
+        ]
+        values = array('q', [node.id for node in nodes])
+        values.extend(node.weight for node in nodes)
+        values.extend(position[edge.source.id] for edge in edges)
+        values.extend(position[edge.target.id] for edge in edges)
+        values.extend(edge.weight or 0 for edge in edges)
+        size = len(values) * values.itemsize
+        memory = SharedMemory(create=True, size=max(size, 1))
+        memory.buf[:size] = values.tobytes()
+        shared = cls(memory.name, system, len(nodes), len(edges))
+        shared._memory = memory
+        return shared
+
+    def _block(self):
+        from multiprocessing.shared_memory import SharedMemory
+
+        if self._memory is not None:
+            return self._memory
+        memory = _blocks.get(self.name)
+        if memory is None:
+            memory = _blocks[self.name] = SharedMemory(self.name)
+        return memory
+
+    def arrays(self):
+        """``(ids, weights, sources, targets, edge weights)`` views of the
+        block, nothing is copied"""
+        (n, m) = (self.nodes, self.edges)
+        view = self._block().buf[:(2 * n + 3 * m) * 8].cast('q')
+        return (view[:n], view[n:2 * n], view[2 * n:2 * n + m],
+                view[2 * n + m:2 * n + 2 * m], view[2 * n + 2 * m:])
+
+    def columns(self):
+        """``columnar.Columns`` over the block"""
+        from columnar import Columns
+        return Columns(*self.arrays())
+
+    def graph(self):
+        """The graph, rebuilt once per process"""
+        graph = _graphs.get(self.name)
+        if graph is not None:
+            return graph
+        (ids, weights, sources, targets, edge_weights) = self.arrays()
+        graph = SystemGraph() if self.system else TaskGraph()
+        for weight in weights:
+            graph.add_node(weight)
+        for (source, target, weight) in zip(sources, targets, edge_weights):
+            if self.system:
+                graph.connect(ids[source], ids[target])
+            else:
+                graph.connect(ids[source], ids[target], weight)
+        graph.freeze()
+        _graphs[self.name] = graph
+        return graph
+
+    def close(self):
+        """Removes the block, once the exporting process is done with it"""
+        _graphs.pop(self.name, None)
+        if self._memory is not None:
+            self._memory.close()
+            self._memory.unlink()
+            self._memory = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -97,18 +97,21 @@ class Graph(gr.Graph):
     def add_node(self, weight):
         if self._frozen:
             raise ValueError('Cannot add node to the frozen graph')
-        node = Node(self._gen(), weight=weight)
-        self._nodes[node.id] = node
-        return node.id
+        return self._add(Node(self._gen(), weight=weight))
 
-    def __str__(self):
+    def to_dot(self, positions=None, fingerprint=None):
+        positions = positions or {}
+        header = ['graph SystemGraph {']
+        if fingerprint is not None:
+            header.append(f'\tfingerprint="{fingerprint}";')
         node_descs = []
         edge_descs = []
         described_edges = set()
 
         for node in self._nodes.values():
             node_descs.append(
-                f'\tNode_{node.id} [label="{node.id} ({node.weight})"];'
+                f'\tNode_{node.id} [label="{node.id} ({node.weight})"'
+                f'{gr.format_pos(positions.get(node.id))}];'
             )
             for edge in node.connections_out:
                 if edge.id not in described_edges:
@@ -117,7 +120,7 @@ class Graph(gr.Graph):
                     )
                 described_edges.add(edge.id)
         return '\n'.join([
-            'graph SystemGraph {',
+            '\n'.join(header),
             '\n'.join(node_descs),
             '\n'.join(edge_descs),
             '}'
@@ -1,8 +1,10 @@
-from collections import defaultdict
-from queue import Queue
+import heapq
+
+from collections.abc import Mapping
+
+from graph import topological_order
 
 
-FAKE_NODE_ID = None
 PATH_END = 'critical_path_end'
 PATH_END_NODE = 'critical_path_end_node'
 PATH_START = 'critical_path_start'
@@ -12,106 +14,307 @@ CONN_OUT = 'conn_out'
 CONN = 'conn'
 EARLY_START = 'early_start'
 LATE_START = 'late_start'
+ASAP_LEVEL = 'asap_level'
+ALAP_LEVEL = 'alap_level'
+
+METRICS = (
+    PATH_END,
+    PATH_END_NODE,
+    PATH_START,
+    PATH_START_NODE,
+    CONN_IN,
+    CONN_OUT,
+    CONN,
+    EARLY_START,
+    LATE_START,
+    ASAP_LEVEL,
+    ALAP_LEVEL,
+)
+
+_ORDER = 'topological_order'
+_CRITICAL_PATH = 'critical_path'
+_PARALLELISM = 'parallelism'
+
+
+class _NodeMetrics(Mapping):
+    """Metrics of a single node, each one is computed on first access"""
+    def __init__(self, tg, node_id):
+        self._tg = tg
+        self._id = node_id
+
+    def __getitem__(self, metric):
+        if metric not in METRICS:
+            raise KeyError(metric)
+        return self._tg.metric(metric)[self._id]
+
+    def __iter__(self):
+        return iter(METRICS)
+
+    def __len__(self):
+        return len(METRICS)
+
+    def __str__(self):
+        return str(dict(self))
+
+    def __repr__(self):
+        return str(self)
+
+
+class Parallelism(object):
+    """Parallelism of a task graph on unlimited processors, without
+    communication costs
+
+    ``levels`` are ``(tasks, work)`` of every ASAP level, ``profile`` is
+    ``(time, tasks running)`` at every change of the number of tasks running
+    when each task starts as early as possible. Tasks of one ASAP or ALAP
+    level, as well as tasks running at the same time, are independent, so
+    ``width`` is a lower bound of the largest set of independent tasks.
+    ``average`` is the total work over the critical path, the number of
+    processors an ideal schedule keeps busy.
+    """
+    def __init__(self, levels, profile, average, width):
+        self.levels = levels
+        self.profile = profile
+        self.average = average
+        self.width = width
 
 
 class TaskGraph(object):
+    # value -> (pass computing it, values the pass depends on)
+    _PASSES = {
+        _ORDER: ('_pass_order', ()),
+        PATH_END: ('_pass_path_end', (_ORDER,)),
+        PATH_END_NODE: ('_pass_path_end', (_ORDER,)),
+        PATH_START: ('_pass_path_start', (_ORDER,)),
+        PATH_START_NODE: ('_pass_path_start', (_ORDER,)),
+        CONN_IN: ('_pass_conns', ()),
+        CONN_OUT: ('_pass_conns', ()),
+        CONN: ('_pass_conns', ()),
+        EARLY_START: ('_pass_early_start', (PATH_START,)),
+        _CRITICAL_PATH: ('_pass_critical_path', (PATH_END, PATH_END_NODE)),
+        LATE_START: ('_pass_late_start', (PATH_END, _CRITICAL_PATH)),
+        ASAP_LEVEL: ('_pass_asap_level', (PATH_START_NODE,)),
+        ALAP_LEVEL: ('_pass_alap_level', (PATH_END_NODE, _CRITICAL_PATH)),
+        _PARALLELISM: ('_pass_parallelism',
+                       (PATH_START, ASAP_LEVEL, ALAP_LEVEL)),
+    }
+
     def __init__(self, graph):
         # assert g.frozen
         self.g = graph
-        self._nodes = defaultdict(dict)
+        self._metrics = {}
+        self._done = set()
+        self._order = None
+        self._path_end_next = {}
+        self._path_start_prev = {}
         self._critical_graph = 0
         self._critical_graph_nodes = 0
-        self._make_metrics()
+        self._parallelism = None
 
-    def _make_metrics(self):
-        start_nodes = self.g.start_nodes
-        end_nodes = self.g.end_nodes
+    def _ensure(self, value):
+        (pass_, dependencies) = self._PASSES[value]
+        if pass_ in self._done:
+            return
+        for dependency in dependencies:
+            self._ensure(dependency)
+        getattr(self, pass_)()
+        self._done.add(pass_)
 
-        todo = Queue()
+    def metric(self, metric):
+        """Returns ``{node_id: value}`` of ``metric``, computing it once"""
+        self._ensure(metric)
+        return self._metrics[metric]
 
-        for node in end_nodes:
-            todo.put((FAKE_NODE_ID, node))
-        while not todo.empty():
-            (next_id, n) = todo.get()
-            path_end = self._nodes[next_id].get(PATH_END, 0) + n.weight
-            path_end_node = self._nodes[next_id].get(PATH_END_NODE, 0) + 1
+    def compute(self, *metrics):
+        """Computes given metrics (all by default) ahead of time"""
+        for metric in metrics or METRICS:
+            self._ensure(metric)
 
-            self._nodes[n.id][PATH_END] = max(
-                self._nodes[n.id].get(PATH_END, 0),
-                path_end,
-            )
-            self._nodes[n.id][PATH_END_NODE] = max(
-                self._nodes[n.id].get(PATH_END_NODE, 0),
-                path_end_node,
-            )
+    def _pass_order(self):
+        self._order = topological_order(self.g)
 
-            for prev in n.connections_in:
-               todo.put((n.id, prev.source))
-
-        for node in start_nodes:
-            todo.put((FAKE_NODE_ID, node))
-        while not todo.empty():
-            (pid, n) = todo.get()
-            if n.is_start_node:
-                path_start = 0
-            else:
-                prev = self.g[pid]
-                path_start = self._nodes[pid].get(PATH_START, 0) + prev.weight
-            path_start_node = self._nodes[pid].get(PATH_START_NODE, 0) + 1
-
-            self._nodes[n.id][PATH_START] = max(
-                self._nodes[n.id].get(PATH_START, 0),
-                path_start,
-            )
-            self._nodes[n.id][PATH_START_NODE] = max(
-                self._nodes[n.id].get(PATH_START_NODE, 0),
-                path_start_node,
-            )
+    def _pass_path_end(self):
+        path_end = {}
+        path_end_node = {}
+        path_end_next = self._path_end_next
+        for n in reversed(self._order):
+            (weight, count, next_) = (0, 0, None)
+            for edge in n.connections_out:
+                if next_ is None or path_end[edge.target.id] > weight:
+                    (weight, next_) = (path_end[edge.target.id], edge.target)
+                count = max(count, path_end_node[edge.target.id])
+            path_end_next[n.id] = next_
+            path_end[n.id] = weight + n.weight
+            path_end_node[n.id] = count + 1
+        self._metrics[PATH_END] = path_end
+        self._metrics[PATH_END_NODE] = path_end_node
 
-            for next_ in n.connections_out:
-               todo.put((n.id, next_.target))
-        del self._nodes[FAKE_NODE_ID]
+    def _pass_path_start(self):
+        path_start = {}
+        path_start_node = {}
+        path_start_prev = self._path_start_prev
+        for n in self._order:
+            (weight, count, best) = (0, 0, None)
+            for edge in n.connections_in:
+                prev = edge.source
+                if best is None or path_start[prev.id] + prev.weight > weight:
+                    (weight, best) = (path_start[prev.id] + prev.weight, prev)
+                count = max(count, path_start_node[prev.id])
+            path_start_prev[n.id] = best
+            path_start[n.id] = weight
+            path_start_node[n.id] = count + 1
+        self._metrics[PATH_START] = path_start
+        self._metrics[PATH_START_NODE] = path_start_node
 
-        self._critical_graph = max(
-            map(lambda n: n[PATH_END], self._nodes.values())
-        )
+    def _pass_conns(self):
+        self._metrics[CONN_IN] = {n.id: n.conns_in for n in self.g}
+        self._metrics[CONN_OUT] = {n.id: n.conns_out for n in self.g}
+        self._metrics[CONN] = {n.id: n.conns for n in self.g}
+
+    def _pass_early_start(self):
+        self._metrics[EARLY_START] = {
+            nid: path_start + 1
+            for (nid, path_start) in self._metrics[PATH_START].items()
+        }
+
+    def _pass_critical_path(self):
+        self._critical_graph = max(self._metrics[PATH_END].values(),
+                                   default=0)
         self._critical_graph_nodes = max(
-            map(lambda n: n[PATH_END_NODE], self._nodes.values())
+            self._metrics[PATH_END_NODE].values(), default=0
         )
 
-        for nid in self._nodes:
-            node = self.g[nid]
-            self._nodes[nid][CONN_IN] = node.conns_in
-            self._nodes[nid][CONN_OUT] = node.conns_out
-            self._nodes[nid][CONN] = node.conns
-            self._nodes[nid][EARLY_START] = self._nodes[nid][PATH_START] + 1
-            self._nodes[nid][LATE_START] = (
-                self._critical_graph - self._nodes[nid][PATH_END] + 1
-            )
-    
+    def _pass_late_start(self):
+        self._metrics[LATE_START] = {
+            nid: self._critical_graph - path_end + 1
+            for (nid, path_end) in self._metrics[PATH_END].items()
+        }
+
+    def _pass_asap_level(self):
+        self._metrics[ASAP_LEVEL] = dict(self._metrics[PATH_START_NODE])
+
+    def _pass_alap_level(self):
+        self._metrics[ALAP_LEVEL] = {
+            nid: self._critical_graph_nodes - path_end_node + 1
+            for (nid, path_end_node) in self._metrics[PATH_END_NODE].items()
+        }
+
+    def _pass_parallelism(self):
+        levels = [[0, 0] for _ in range(self._critical_graph_nodes)]
+        late_levels = [0] * self._critical_graph_nodes
+        for level in self._metrics[ALAP_LEVEL].values():
+            late_levels[level - 1] += 1
+        change = {}
+        path_start = self._metrics[PATH_START]
+        for (nid, level) in self._metrics[ASAP_LEVEL].items():
+            weight = self.g[nid].weight
+            levels[level - 1][0] += 1
+            levels[level - 1][1] += weight
+            start = path_start[nid]
+            change[start] = change.get(start, 0) + 1
+            change[start + weight] = change.get(start + weight, 0) - 1
+        profile = []
+        running = 0
+        for time in sorted(change):
+            if change[time]:
+                running += change[time]
+                profile.append((time, running))
+        work = sum(node.weight for node in self.g)
+        self._parallelism = Parallelism(
+            [tuple(level) for level in levels], profile,
+            work / self._critical_graph if self._critical_graph else 0,
+            max([tasks for (tasks, _) in levels] + late_levels
+                + [running for (_, running) in profile] + [0]),
+        )
+
+    def parallelism(self):
+        """``Parallelism`` of the graph, computed once"""
+        self._ensure(_PARALLELISM)
+        return self._parallelism
+
     @property
     def critical_path(self):
+        self._ensure(_CRITICAL_PATH)
         return self._critical_graph
 
     @property
     def critical_path_node(self):
+        self._ensure(_CRITICAL_PATH)
         return self._critical_graph_nodes
 
+    def critical_path_nodes(self):
+        """Nodes of a path of ``critical_path`` weight, from start to end"""
+        path_end = self.metric(PATH_END)
+        if not path_end:
+            return []
+        node = self.g[max(path_end, key=lambda nid: (path_end[nid], -nid))]
+        path = []
+        while node is not None:
+            path.append(node)
+            node = self._path_end_next[node.id]
+        return path
+
+    def path_to(self, node_id):
+        """Heaviest path from a start node to ``node_id``, excluding it"""
+        self._ensure(PATH_START)
+        path = []
+        node = self._path_start_prev[node_id]
+        while node is not None:
+            path.append(node)
+            node = self._path_start_prev[node.id]
+        path.reverse()
+        return path
+
+    def longest_paths(self, k):
+        """Up to ``k`` heaviest start-to-end paths as ``(weight, nodes)``
+
+        Best-first search over path prefixes, a prefix is bounded by its
+        weight plus ``PATH_END`` of its last node, which is exact, so paths
+        come out in order of decreasing weight.
+        """
+        path_end = self.metric(PATH_END)
+        heap = []
+        seq = 0
+        for node in self.g.start_nodes:
+            seq += 1
+            heap.append((-path_end[node.id], seq, 0, (node, None)))
+        heapq.heapify(heap)
+        paths = []
+        while heap and len(paths) < k:
+            (bound, _, prefix, chain) = heapq.heappop(heap)
+            node = chain[0]
+            if node.is_end_node:
+                path = []
+                while chain is not None:
+                    path.append(chain[0])
+                    chain = chain[1]
+                path.reverse()
+                paths.append((-bound, path))
+                continue
+            prefix += node.weight
+            for edge in node.connections_out:
+                seq += 1
+                heapq.heappush(heap, (
+                    -(prefix + path_end[edge.target.id]), seq, prefix,
+                    (edge.target, chain),
+                ))
+        return paths
+
     def prioritize_nodes(self, alg):
         return sorted([
-            (self.g[node_id], alg(self, *self[node_id]))
-            for node_id in self._nodes
+            (node, alg(self, *self[node.id]))
+            for node in self.g
         ], key=lambda x: x[1])
 
     def __getitem__(self, key):
-        return (self.g[key], self._nodes[key])
+        return (self.g[key], _NodeMetrics(self, key))
 
     def __str__(self):
         node_descs = []
         edge_descs = []
 
-        for node_id in self._nodes:
-            (node, metrics) = self[node_id]
+        for node in self.g:
+            (node, metrics) = self[node.id]
             metrics_desc = '\\n'.join(f'{k}: {v}' for k, v in metrics.items())
             node_desc = (
                 f'\tNode_{node.id} '
@@ -146,6 +349,13 @@ def alg_critical_path_start(graph, node, metrics):
     return metrics[PATH_START]
 
 
+ALGORITHMS = (
+    alg_diff_late_early,
+    alg_node_connectivity,
+    alg_critical_path_start,
+)
+
+
 if __name__ == '__main__':
     from reader import read_task_graph_file
     g = read_task_graph_file('examples/task_graph_2.dot')
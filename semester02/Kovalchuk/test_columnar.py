@@ -0,0 +1,75 @@
+import os
+import random
+
+import pytest
+
+import columnar
+import dot_stream
+from columnar import Columns, levels, path_metrics
+from generator import GraphBuilder
+from graph import Graph
+from reader import read_task_graph_file
+from task_graph import (PATH_END, PATH_END_NODE, PATH_START,
+                        PATH_START_NODE, TaskGraph)
+
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'examples')
+PATH_METRICS = (PATH_START, PATH_START_NODE, PATH_END, PATH_END_NODE)
+
+
+def _graphs():
+    for name in ('task_graph.dot', 'task_graph_2.dot'):
+        yield read_task_graph_file(os.path.join(EXAMPLES, name))
+    for seed in range(3):
+        builder = GraphBuilder(random.Random(seed))
+        yield builder.set_num_nodes(200).set_correlation(0.05).build()
+
+
+def _check(columns, g, jobs=1):
+    metrics = path_metrics(columns, jobs)
+    tg = TaskGraph(g)
+    for metric in PATH_METRICS:
+        assert columns.to_dict(metrics[metric]) == tg.metric(metric)
+
+
+@pytest.mark.parametrize('g', list(_graphs()))
+def test_path_metrics_from_graph(g):
+    _check(Columns.from_graph(g), g)
+
+
+@pytest.mark.parametrize('g', list(_graphs()))
+def test_path_metrics_from_statements(g):
+    text = g.to_dot().encode()
+    statements = dot_stream.statements(text.splitlines(keepends=True))
+    _check(Columns.from_statements(statements), g)
+
+
+def test_missing_edge_weights_are_zero():
+    text = (b'digraph TaskGraph {\n'
+            b'\tNode_1 [label="1 (2)"];\n'
+            b'\tNode_2 [label="2 (3)"];\n'
+            b'\tNode_1 -> Node_2;\n'
+            b'}\n')
+    columns = Columns.from_statements(dot_stream.statements(
+        text.splitlines(keepends=True)
+    ))
+    assert columns.edge_weights.tolist() == [0]
+    metrics = path_metrics(columns)
+    assert columns.to_dict(metrics[PATH_START]) == {1: 0, 2: 2}
+    assert columns.to_dict(metrics[PATH_END]) == {1: 5, 2: 3}
+
+
+def test_wide_levels_split_between_threads(monkeypatch):
+    monkeypatch.setattr(columnar, '_CHUNK', 2)
+    for g in _graphs():
+        _check(Columns.from_graph(g), g, jobs=3)
+
+
+def test_levels_reject_cycles():
+    g = Graph()
+    (a, b) = (g.add_node(1), g.add_node(1))
+    g.connect(a, b, 1)
+    g.connect(b, a, 1)
+    with pytest.raises(ValueError):
+        levels(Columns.from_graph(g))
@@ -0,0 +1,25 @@
+import random
+
+import pytest
+
+from generator import GraphBuilder, build_topology
+from genetic import evolve
+from scheduler import POLICIES, list_schedule
+from task_graph import ALGORITHMS, TaskGraph
+from test_transforms import _check_schedule
+
+
+@pytest.mark.parametrize('generations', [0, 20])
+@pytest.mark.parametrize('seed', range(3))
+def test_evolve_never_loses_to_list_schedules(generations, seed):
+    builder = GraphBuilder(random.Random(seed))
+    g = builder.set_num_nodes(30).set_correlation(0.2).build()
+    tg = TaskGraph(g)
+    system = build_topology('mesh:2x2')
+    schedule = evolve(tg, system, population=16, generations=generations,
+                      jobs=1, seed=seed)
+    _check_schedule(schedule, g, system)
+    assert schedule.makespan <= min(
+        list_schedule(tg, system, alg, policy).makespan
+        for alg in ALGORITHMS for policy in POLICIES
+    ) + 1e-9
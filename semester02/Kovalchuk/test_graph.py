@@ -0,0 +1,110 @@
+import random
+
+import pytest
+
+from graph import Graph, topological_order
+from validators import CycleDetectedException
+
+
+def _check_index(g):
+    assert sorted(node.id for node in g.start_nodes) == sorted(
+        node.id for node in g if node.is_start_node
+    )
+    assert sorted(node.id for node in g.end_nodes) == sorted(
+        node.id for node in g if node.is_end_node
+    )
+    for degree in range(g.max_degree + 1):
+        assert [node.id for node in g.nodes_with_degree(degree)] == [
+            node.id for node in g if node.conns == degree
+        ]
+
+
+def test_indexes_follow_changes():
+    rand = random.Random(0)
+    g = Graph()
+    ids = [g.add_node(1) for _ in range(30)]
+    assert [node.id for node in g.start_nodes] == ids
+    starts = g.start_nodes
+    for _ in range(200):
+        (a, b) = sorted(rand.sample(ids, 2))
+        if rand.random() < 0.7:
+            if b not in g[a]._outgoing:
+                g.connect(a, b, 1)
+        else:
+            g.disconnect(a, b)
+        _check_index(g)
+    assert sorted(node.id for node in starts) == sorted(
+        node.id for node in g.start_nodes
+    )
+    removed = ids.pop(rand.randrange(len(ids)))
+    g.del_node(removed)
+    ids.append(g.add_node(2))
+    _check_index(g)
+
+
+def _reaches(g, start, goal):
+    seen = {start}
+    todo = [start]
+    while todo:
+        node_id = todo.pop()
+        if node_id == goal:
+            return True
+        for edge in g[node_id].connections_out:
+            if edge.target.id not in seen:
+                seen.add(edge.target.id)
+                todo.append(edge.target.id)
+    return False
+
+
+def _check_order(g):
+    order = g._order
+    assert sorted(order) == sorted(node.id for node in g)
+    assert len(set(order.values())) == len(order)
+    for node in g:
+        for edge in node.connections_out:
+            assert order[node.id] < order[edge.target.id]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_keep_order_rejects_cycles(seed):
+    rand = random.Random(seed)
+    g = Graph()
+    ids = [g.add_node(1) for _ in range(25)]
+    g.keep_order()
+    for _ in range(400):
+        (a, b) = rand.sample(ids, 2)
+        if rand.random() < 0.1:
+            g.disconnect(a, b)
+        elif rand.random() < 0.02:
+            g.del_node(a)
+            ids.remove(a)
+            ids.append(g.add_node(1))
+        elif b not in g[a]._outgoing:
+            if _reaches(g, b, a):
+                edges = sum(node.conns_out for node in g)
+                order = dict(g._order)
+                with pytest.raises(CycleDetectedException):
+                    g.connect(a, b, 1)
+                assert sum(node.conns_out for node in g) == edges
+                assert g._order == order
+            else:
+                g.connect(a, b, 1)
+        _check_order(g)
+    assert len(topological_order(g)) == len(g)
+
+
+def test_keep_order_refuses_cyclic_graph():
+    g = Graph()
+    (a, b, c) = [g.add_node(1) for _ in range(3)]
+    g.connect(a, b, 1)
+    g.connect(b, c, 1)
+    g.connect(c, a, 1)
+    with pytest.raises(CycleDetectedException):
+        g.keep_order()
+    assert not g.ordered
+    g.disconnect(c, a)
+    g.keep_order()
+    with pytest.raises(CycleDetectedException):
+        g.connect(c, a, 1)
+    with pytest.raises(CycleDetectedException):
+        g.connect(a, a, 1)
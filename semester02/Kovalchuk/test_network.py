@@ -0,0 +1,30 @@
+import pytest
+
+from generator import build_topology
+from network import NetworkSimulator, STORE_AND_FORWARD, CIRCUIT_SWITCHED
+
+
+# 1 -> 3 of size 2 at 0 and 2 -> 3 of size 1 at 1 on the line 1 - 2 - 3
+MESSAGES = [(1, 3, 2, 0), (2, 3, 1, 1), (3, 3, 5, 0)]
+
+
+@pytest.mark.parametrize(('mode', 'arrivals'), [
+    (STORE_AND_FORWARD, [4, 2, 0]),
+    (CIRCUIT_SWITCHED, [2, 3, 0]),
+])
+def test_link_contention(mode, arrivals):
+    simulator = NetworkSimulator(build_topology('line:3'), mode)
+    assert simulator.simulate(MESSAGES) == arrivals
+    if mode == STORE_AND_FORWARD:
+        assert simulator.timelines == {(1, 2): [(0, 2, 1)],
+                                       (2, 3): [(1, 2, 2), (2, 4, 1)]}
+    assert simulator.link_busy_time()[2, 3] == 3
+
+
+def test_routes_are_shared():
+    simulator = NetworkSimulator(build_topology('torus:4x4'))
+    first = simulator._message(1, 11, 1, 0)
+    second = simulator._message(1, 11, 1, 0)
+    assert first.route == tuple(simulator.routes.path(1, 11))
+    assert first.links is second.links
+    assert len(first.links) == simulator.routes.hops(1, 11)
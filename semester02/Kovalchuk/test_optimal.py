@@ -0,0 +1,27 @@
+import random
+
+import pytest
+
+from bounds import lower_bound
+from generator import GraphBuilder, build_topology
+from optimal import optimal_schedule
+from scheduler import POLICIES, list_schedule
+from task_graph import ALGORITHMS, TaskGraph
+from test_transforms import _check_schedule
+
+
+@pytest.mark.parametrize('topology', ['line:3', 'full:2'])
+@pytest.mark.parametrize('seed', range(4))
+def test_optimal_beats_list_schedules(topology, seed):
+    builder = GraphBuilder(random.Random(seed))
+    g = builder.set_num_nodes(8).set_correlation(0.3).build()
+    tg = TaskGraph(g)
+    system = build_topology(topology)
+    (schedule, exact) = optimal_schedule(tg, system, jobs=1)
+    assert exact
+    _check_schedule(schedule, g, system)
+    assert schedule.makespan <= min(
+        list_schedule(tg, system, alg, policy).makespan
+        for alg in ALGORITHMS for policy in POLICIES
+    )
+    assert schedule.makespan >= lower_bound([tg], [system])[0, 0] - 1e-9
@@ -0,0 +1,78 @@
+import os
+
+import pytest
+
+import reader
+from cache import CACHE_ENV
+
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'examples')
+
+# as formatted by ``dot``, not in the dialect ``save`` writes
+GRAPHVIZ = '''digraph TaskGraph {
+	graph [bb="0,0,54,108"];
+	node [label="\\N"];
+	Node_1	[height=0.5,
+		label="1 (2)",
+		pos="27,90",
+		width=0.75];
+	Node_2	[label="2 (3)"];
+	Node_1 -> Node_2	[label=4];
+}
+'''
+
+
+def _edges(graph):
+    return sorted((edge.source.id, edge.target.id, edge.weight)
+                  for node in graph for edge in node.connections_out)
+
+
+@pytest.fixture(params=[False, True], ids=['plain', 'cached'])
+def cache(request, tmp_path, monkeypatch):
+    if request.param:
+        monkeypatch.setenv(CACHE_ENV, str(tmp_path / 'cache.sqlite'))
+    else:
+        monkeypatch.delenv(CACHE_ENV, raising=False)
+    return request.param
+
+
+@pytest.mark.parametrize('use_mmap', [False, True])
+def test_reads_graphviz_output(tmp_path, cache, use_mmap):
+    filename = str(tmp_path / 'graphviz.dot')
+    with open(filename, 'w') as file_:
+        file_.write(GRAPHVIZ)
+    g = reader.read_task_graph_file(filename, use_mmap=use_mmap)
+    assert [node.weight for node in g] == [2, 3]
+    assert _edges(g) == [(1, 2, 4)]
+    assert len(reader.read_system_graph_file(filename, use_mmap=use_mmap)) == 2
+    graphs = list(reader.iter_task_graphs_file(filename, use_mmap=use_mmap))
+    assert [_edges(graph) for graph in graphs] == [[(1, 2, 4)]]
+
+
+def test_reads_graphs_at_offsets(tmp_path, cache):
+    contents = []
+    for name in ('task_graph.dot', 'task_graph_2.dot'):
+        with open(os.path.join(EXAMPLES, name)) as file_:
+            contents.append(file_.read().rstrip() + '\n')
+    contents.append(GRAPHVIZ)
+    filename = str(tmp_path / 'corpus.dot')
+    with open(filename, 'w') as file_:
+        file_.write(''.join(contents))
+    offsets = reader.graph_index(filename)
+    assert len(offsets) == 3
+    expected = [_edges(reader.read_task_graph(content))
+                for content in contents]
+    assert [_edges(reader.read_task_graph_file(filename, offset=offset))
+            for offset in offsets] == expected
+
+
+def test_graph_content_ends_at_next_graph(tmp_path):
+    first = 'digraph TaskGraph {\n\tNode_1 [label="1 (2)"];\n}\n'
+    second = 'digraph TaskGraph {\n\tNode_1 [label="1 (5)"];\n}\n'
+    filename = str(tmp_path / 'corpus.dot')
+    with open(filename, 'w') as file_:
+        file_.write(first + second)
+    with open(filename, 'rb') as source:
+        assert reader._graph_content(source, 0) == first
+        assert reader._graph_content(source, len(first)) == second
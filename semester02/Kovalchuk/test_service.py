@@ -0,0 +1,57 @@
+import asyncio
+import json
+
+from concurrent.futures import ThreadPoolExecutor
+
+import service
+
+
+GRAPH = 'digraph TaskGraph {\n\tNode_1 [label="1 (2)"];\n}\n'
+
+
+async def _post(port, payload):
+    (reader, writer) = await asyncio.open_connection('127.0.0.1', port)
+    body = json.dumps(payload).encode()
+    writer.write(b'POST /analyse HTTP/1.1\r\nConnection: close\r\n'
+                 b'Content-Length: %d\r\n\r\n' % len(body) + body)
+    response = await reader.read()
+    writer.close()
+    (head, _, data) = response.partition(b'\r\n\r\n')
+    return (int(head.split()[1]), json.loads(data))
+
+
+def _request(executor, payload):
+    async def run():
+        loop = asyncio.get_running_loop()
+        analysis = service.AnalysisService(loop, executor)
+        server = await asyncio.start_server(analysis.handle, '127.0.0.1', 0)
+        async with server:
+            port = server.sockets[0].getsockname()[1]
+            return await asyncio.wait_for(_post(port, payload), 10)
+    return asyncio.run(run())
+
+
+def test_analyses_graph():
+    with ThreadPoolExecutor(1) as executor:
+        (status, record) = _request(executor, {'graph': GRAPH})
+    assert status == 200
+    assert record['critical_path'] == 2
+
+
+def test_failed_analysis_is_server_error(monkeypatch):
+    def fail(items):
+        raise RuntimeError('worker died')
+
+    monkeypatch.setattr(service, '_analyse_batch', fail)
+    with ThreadPoolExecutor(1) as executor:
+        (status, reply) = _request(executor, {'graph': GRAPH})
+    assert status == 500
+    assert 'worker died' in reply['error']
+
+
+def test_broken_executor_is_server_error():
+    executor = ThreadPoolExecutor(1)
+    executor.shutdown()
+    (status, reply) = _request(executor, {'graph': GRAPH})
+    assert status == 500
+    assert 'error' in reply
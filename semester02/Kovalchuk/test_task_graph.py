@@ -0,0 +1,106 @@
+import os
+import random
+
+from collections import defaultdict, deque
+
+import pytest
+
+import task_graph
+from generator import GraphBuilder
+from reader import read_task_graph_file
+from task_graph import TaskGraph
+
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'examples')
+
+
+def _baseline_metrics(g):
+    """Metrics as the first TaskGraph computed them, by pushing every path
+    through a queue"""
+    nodes = defaultdict(dict)
+    todo = deque((None, node) for node in g if node.is_end_node)
+    while todo:
+        (next_id, n) = todo.popleft()
+        metrics = nodes[n.id]
+        metrics['path_end'] = max(metrics.get('path_end', 0),
+                                  nodes[next_id].get('path_end', 0) + n.weight)
+        metrics['path_end_node'] = max(
+            metrics.get('path_end_node', 0),
+            nodes[next_id].get('path_end_node', 0) + 1,
+        )
+        todo.extend((n.id, edge.source) for edge in n.connections_in)
+    todo = deque((None, node) for node in g if node.is_start_node)
+    while todo:
+        (prev_id, n) = todo.popleft()
+        metrics = nodes[n.id]
+        path_start = 0
+        if not n.is_start_node:
+            path_start = nodes[prev_id]['path_start'] + g[prev_id].weight
+        metrics['path_start'] = max(metrics.get('path_start', 0), path_start)
+        metrics['path_start_node'] = max(
+            metrics.get('path_start_node', 0),
+            nodes[prev_id].get('path_start_node', 0) + 1,
+        )
+        todo.extend((n.id, edge.target) for edge in n.connections_out)
+    nodes.pop(None, None)
+    critical = max(m['path_end'] for m in nodes.values())
+    critical_nodes = max(m['path_end_node'] for m in nodes.values())
+    expected = {}
+    for (nid, m) in nodes.items():
+        node = g[nid]
+        expected[nid] = {
+            task_graph.PATH_END: m['path_end'],
+            task_graph.PATH_END_NODE: m['path_end_node'],
+            task_graph.PATH_START: m['path_start'],
+            task_graph.PATH_START_NODE: m['path_start_node'],
+            task_graph.CONN_IN: node.conns_in,
+            task_graph.CONN_OUT: node.conns_out,
+            task_graph.CONN: node.conns,
+            task_graph.EARLY_START: m['path_start'] + 1,
+            task_graph.LATE_START: critical - m['path_end'] + 1,
+            task_graph.ASAP_LEVEL: m['path_start_node'],
+            task_graph.ALAP_LEVEL: critical_nodes - m['path_end_node'] + 1,
+        }
+    return (expected, critical, critical_nodes)
+
+
+def _graphs():
+    for name in ('task_graph.dot', 'task_graph_2.dot'):
+        yield (name, read_task_graph_file(os.path.join(EXAMPLES, name)))
+    for seed in range(5):
+        builder = GraphBuilder(random.Random(seed))
+        yield (f'random-{seed}',
+               builder.set_num_nodes(20).set_correlation(0.2).build())
+
+
+@pytest.mark.parametrize('name,g', list(_graphs()),
+                         ids=[name for (name, _) in _graphs()])
+def test_metrics_match_baseline(name, g):
+    (expected, critical, critical_nodes) = _baseline_metrics(g)
+    tg = TaskGraph(g)
+    assert tg.critical_path == critical
+    assert tg.critical_path_node == critical_nodes
+    assert {node.id: dict(tg[node.id][1]) for node in g} == expected
+    for metric in task_graph.METRICS:
+        assert tg.metric(metric) == {
+            nid: metrics[metric] for (nid, metrics) in expected.items()
+        }
+
+
+@pytest.mark.parametrize('name,g', list(_graphs()),
+                         ids=[name for (name, _) in _graphs()])
+def test_paths_have_metric_weights(name, g):
+    tg = TaskGraph(g)
+    path = tg.critical_path_nodes()
+    assert sum(node.weight for node in path) == tg.critical_path
+    for (a, b) in zip(path, path[1:]):
+        assert b.id in a._outgoing
+    path_start = tg.metric(task_graph.PATH_START)
+    for node in g:
+        assert sum(prev.weight for prev in tg.path_to(node.id)) == (
+            path_start[node.id]
+        )
+    weights = [weight for (weight, _) in tg.longest_paths(5)]
+    assert weights[0] == tg.critical_path
+    assert weights == sorted(weights, reverse=True)
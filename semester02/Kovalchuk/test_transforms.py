@@ -0,0 +1,93 @@
+import random
+
+import pytest
+
+from generator import GraphBuilder, build_topology
+from graph import topological_order
+from scheduler import Routes, list_schedule, portfolio
+from task_graph import TaskGraph, alg_critical_path_start
+from transforms import collapse_chains, zero_edges
+
+
+def _graph(seed, nodes=60, correlation=0.2):
+    builder = GraphBuilder(random.Random(seed))
+    return builder.set_num_nodes(nodes).set_correlation(correlation).build()
+
+
+def _parallel_time(graph):
+    """Critical path with communication, every task on its own processor"""
+    finish = {}
+    for node in topological_order(graph):
+        finish[node.id] = node.weight + max(
+            (finish[edge.source.id] + edge.weight
+             for edge in node.connections_in),
+            default=0,
+        )
+    return max(finish.values(), default=0)
+
+
+def _check_schedule(schedule, graph, system):
+    routes = Routes(system)
+    assignments = schedule.assignments
+    assert set(assignments) == {node.id for node in graph}
+    for node in graph:
+        (proc, start, end) = assignments[node.id]
+        assert end - start == pytest.approx(node.weight / system[proc].weight)
+        for edge in node.connections_in:
+            (source_proc, _, ready) = assignments[edge.source.id]
+            if source_proc != proc:
+                ready += edge.weight * routes.hops(source_proc, proc)
+            assert start >= ready - 1e-9
+    for proc in system:
+        spans = sorted((start, end) for (p, start, end)
+                       in assignments.values() if p == proc.id)
+        for ((_, end), (start, _)) in zip(spans, spans[1:]):
+            assert end <= start + 1e-9
+
+
+@pytest.mark.parametrize('coarsen', [collapse_chains, zero_edges])
+@pytest.mark.parametrize('seed', range(3))
+def test_clusters_cover_tasks(coarsen, seed):
+    g = _graph(seed)
+    clustering = coarsen(g)
+    assert sorted(clustering.cluster_of) == sorted(node.id for node in g)
+    topological_order(clustering.graph)
+    position = {node.id: ix for (ix, node) in enumerate(topological_order(g))}
+    for (cluster_id, tasks) in clustering.members.items():
+        assert clustering.graph[cluster_id].weight == sum(
+            g[task_id].weight for task_id in tasks
+        )
+        assert tasks == sorted(tasks, key=position.get)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_zero_edges_keeps_parallel_time(seed):
+    g = _graph(seed)
+    clustering = zero_edges(g)
+    assert len(clustering) < len(g)
+    assert _parallel_time(clustering.graph) <= _parallel_time(g)
+
+
+@pytest.mark.parametrize('coarsen', [collapse_chains, zero_edges])
+@pytest.mark.parametrize('seed', range(3))
+def test_expanded_schedule_is_valid(coarsen, seed):
+    g = _graph(seed)
+    system = build_topology('mesh:2x4')
+    clustering = coarsen(g)
+    coarse = list_schedule(TaskGraph(clustering.graph), system,
+                           alg_critical_path_start)
+    schedule = clustering.expand_schedule(coarse, g)
+    _check_schedule(schedule, g, system)
+    assert schedule.makespan <= coarse.makespan + 1e-9
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_zero_edges_schedules_communication_heavy_graphs(seed):
+    g = _graph(seed)
+    system = build_topology('full:8')
+    (plain, _) = portfolio(TaskGraph(g), system, jobs=1)
+    clustering = zero_edges(g)
+    (coarse, _) = portfolio(TaskGraph(clustering.graph), system, jobs=1)
+    schedule = clustering.expand_schedule(coarse, g)
+    _check_schedule(schedule, g, system)
+    assert schedule.makespan <= 1.5 * plain.makespan
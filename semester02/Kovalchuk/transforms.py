@@ -0,0 +1,313 @@
+from graph import Graph, topological_order
+from scheduler import Schedule
+
+
+def _reachability(order, position):
+    """Bitsets of nodes reachable from each node, indexed by position"""
+    reach = [0] * len(order)
+    for node in reversed(order):
+        bits = 0
+        for edge in node.connections_out:
+            target = position[edge.target.id]
+            bits |= reach[target] | (1 << target)
+        reach[position[node.id]] = bits
+    return reach
+
+
+def _longest_detours(order, position, reach, source, targets):
+    """Heaviest paths of two or more edges from ``source`` to ``targets``
+
+    Length counts edge weights and weights of intermediate nodes.
+    """
+    start = position[source.id]
+    end = max(position[t.id] for t in targets)
+    reachable = reach[start]
+    dist = {}
+    detours = {}
+    wanted = set(t.id for t in targets)
+    for node in order[start + 1:end + 1]:
+        if not reachable >> position[node.id] & 1:
+            continue
+        best = None
+        detour = None
+        for edge in node.connections_in:
+            prev = edge.source
+            if prev is source:
+                best = max(best or 0, edge.weight)
+            elif prev.id in dist:
+                length = dist[prev.id] + prev.weight + edge.weight
+                best = max(best or 0, length)
+                detour = max(detour or 0, length)
+        dist[node.id] = best
+        if node.id in wanted:
+            detours[node.id] = detour
+    return detours
+
+
+def transitive_reduction(graph, precedence_only=False):
+    """Drops edges implied by longer paths, returns ``(graph, removed)``
+
+    Reachability is kept as bitsets built in reverse topological order. An
+    edge ``u -> v`` is implied when ``v`` is reachable from another
+    successor of ``u``. By default implied edges are kept if they are
+    heavier than the heaviest detour (edge weights plus intermediate node
+    weights), so communication-aware path lengths do not change. With
+    ``precedence_only`` every implied edge is removed.
+
+    Nodes of the returned graph are numbered in order of ``graph``.
+    """
+    order = topological_order(graph)
+    position = {node.id: ix for (ix, node) in enumerate(order)}
+    reach = _reachability(order, position)
+
+    implied = {}
+    for node in order:
+        covered = 0
+        edges = sorted(node.connections_out,
+                       key=lambda e: position[e.target.id])
+        for edge in edges:
+            target = position[edge.target.id]
+            if covered >> target & 1:
+                implied.setdefault(node.id, []).append(edge)
+            covered |= reach[target] | (1 << target)
+
+    removed = set()
+    for (source_id, edges) in implied.items():
+        if precedence_only:
+            removed.update(edge.id for edge in edges)
+            continue
+        # a detour through successor w weighs at least c(u, w) + weight(w)
+        unsure = []
+        for edge in edges:
+            target = position[edge.target.id]
+            if any(
+                reach[position[other.target.id]] >> target & 1
+                and other.weight + other.target.weight >= edge.weight
+                for other in graph[source_id].connections_out
+            ):
+                removed.add(edge.id)
+            else:
+                unsure.append(edge)
+        if unsure:
+            detours = _longest_detours(order, position, reach,
+                                       graph[source_id],
+                                       [e.target for e in unsure])
+            removed.update(
+                edge.id for edge in unsure
+                if detours[edge.target.id] >= edge.weight
+            )
+
+    g = Graph()
+    id_map = {}
+    for node in graph:
+        id_map[node.id] = g.add_node(node.weight)
+    for node in graph:
+        for edge in node.connections_out:
+            if edge.id not in removed:
+                g.connect(id_map[edge.source.id], id_map[edge.target.id],
+                          edge.weight)
+    return (g, len(removed))
+
+
+class Clustering(object):
+    """Coarse graph of task clusters and the way back to original tasks
+
+    ``members`` maps a node of the coarse ``graph`` to ids of original
+    tasks in topological order, those run back to back on one processor.
+    """
+    def __init__(self, graph, members):
+        self.graph = graph
+        self.members = members
+        self.cluster_of = {
+            task_id: cluster_id
+            for (cluster_id, tasks) in members.items()
+            for task_id in tasks
+        }
+
+    def expand(self, cluster_ids):
+        """Original task ids of given clusters, in the given order"""
+        return [
+            task_id
+            for cluster_id in cluster_ids
+            for task_id in self.members[cluster_id]
+        ]
+
+    def expand_schedule(self, schedule, original):
+        """Schedule of ``original`` graph tasks out of coarse ``schedule``"""
+        result = Schedule()
+        for (cluster_id, (proc, start, end)) in schedule.assignments.items():
+            weight = self.graph[cluster_id].weight
+            scale = (end - start) / weight if weight else 0
+            for task_id in self.members[cluster_id]:
+                duration = original[task_id].weight * scale
+                result.assign(task_id, proc, start, start + duration)
+                start += duration
+        return result
+
+    def __len__(self):
+        return len(self.members)
+
+
+def _quotient(graph, order, cluster_of):
+    """Builds coarse graph out of ``{task_id: cluster key}`` mapping"""
+    grouped = {}
+    for node in order:
+        grouped.setdefault(cluster_of[node.id], []).append(node)
+    g = Graph()
+    ids = {}
+    members = {}
+    for (key, nodes) in grouped.items():
+        ids[key] = g.add_node(sum(node.weight for node in nodes))
+        members[ids[key]] = [node.id for node in nodes]
+    weights = {}
+    for node in order:
+        source = ids[cluster_of[node.id]]
+        for edge in node.connections_out:
+            target = ids[cluster_of[edge.target.id]]
+            if source != target:
+                weights[source, target] = (
+                    weights.get((source, target), 0) + edge.weight
+                )
+    for ((source, target), weight) in weights.items():
+        g.connect(source, target, weight)
+    return Clustering(g, members)
+
+
+def collapse_chains(graph):
+    """Merges every ``u -> v`` with single output of u and single input of v"""
+    order = topological_order(graph)
+    cluster_of = {}
+    for node in order:
+        if node.conns_in == 1:
+            prev = next(node.connections_in).source
+            if prev.conns_out == 1:
+                cluster_of[node.id] = cluster_of[prev.id]
+                continue
+        cluster_of[node.id] = node.id
+    return _quotient(graph, order, cluster_of)
+
+
+def _parallel_time(clusters, weight, succ, a=None, b=None):
+    """Critical path of the cluster graph, communication included
+
+    Clusters run on unlimited processors, edges between them cost their
+    weight. With ``a`` and ``b`` it is the time after ``b`` is merged into
+    ``a``, ``clusters`` being the order after the merge.
+    """
+    ready = {}
+    time = 0
+    for cid in clusters:
+        if cid is None:
+            continue
+        outs = succ[cid]
+        end = ready.get(cid, 0) + weight[cid]
+        if cid == a:
+            end += weight[b]
+            outs = dict(outs)
+            for (target, w) in succ[b].items():
+                outs[target] = outs.get(target, 0) + w
+            del outs[b]
+        elif b in outs:
+            outs = dict(outs)
+            outs[a] = outs.get(a, 0) + outs.pop(b)
+        for (target, w) in outs.items():
+            ready[target] = max(ready.get(target, 0), end + w)
+        time = max(time, end)
+    return time
+
+
+def zero_edges(graph, min_weight=1, max_cluster_weight=None):
+    """Edge-zeroing clustering, heaviest edges first
+
+    As in Sarkar's algorithm, endpoints of an edge are merged only if the
+    critical path of the cluster graph, communication included, does not
+    get longer. Merges that create a cycle in the cluster graph or a
+    cluster heavier than ``max_cluster_weight`` are skipped too. Clusters
+    are kept in a topological order, so the cycle check only walks clusters
+    placed between the two.
+    """
+    order = topological_order(graph)
+    parent = {node.id: node.id for node in order}
+
+    def find(cid):
+        while parent[cid] != cid:
+            parent[cid] = parent[parent[cid]]
+            cid = parent[cid]
+        return cid
+
+    weight = {node.id: node.weight for node in order}
+    succ = {node.id: {} for node in order}
+    pred = {node.id: {} for node in order}
+    for node in order:
+        for edge in node.connections_out:
+            succ[node.id][edge.target.id] = edge.weight
+            pred[edge.target.id][node.id] = edge.weight
+    clusters = [node.id for node in order]
+    position = {cid: ix for (ix, cid) in enumerate(clusters)}
+    time = _parallel_time(clusters, weight, succ)
+
+    edges = sorted(
+        (edge for node in order for edge in node.connections_out
+         if edge.weight >= min_weight),
+        key=lambda e: (-e.weight, position[e.source.id],
+                       position[e.target.id]),
+    )
+    for edge in edges:
+        (a, b) = (find(edge.source.id), find(edge.target.id))
+        if a == b or (max_cluster_weight is not None
+                      and weight[a] + weight[b] > max_cluster_weight):
+            continue
+        limit = position[b]
+        reached = set()
+        todo = [c for c in succ[a] if c != b]
+        cyclic = False
+        while todo:
+            cid = todo.pop()
+            if cid in reached or position[cid] > limit:
+                continue
+            if cid == b:
+                cyclic = True
+                break
+            reached.add(cid)
+            todo.extend(succ[cid])
+        if cyclic:
+            continue
+
+        # a absorbs b, clusters reachable from a move behind it and freed
+        # slots are left empty, so positions outside of the range hold
+        first = position[a]
+        between = [cid for cid in clusters[first + 1:limit]
+                   if cid is not None]
+        rearranged = (
+            [cid for cid in between if cid not in reached] + [a]
+            + [cid for cid in between if cid in reached]
+        )
+        merged = _parallel_time(
+            clusters[:first] + rearranged + clusters[limit + 1:],
+            weight, succ, a, b,
+        )
+        if merged > time:
+            continue
+        time = merged
+        padding = limit + 1 - first - len(rearranged)
+        clusters[first:limit + 1] = [None] * padding + rearranged
+        for (ix, cid) in enumerate(rearranged, first + padding):
+            position[cid] = ix
+        del position[b]
+        parent[b] = a
+        weight[a] += weight.pop(b)
+        del succ[a][b]
+        del pred[b][a]
+        for (target, w) in succ.pop(b).items():
+            succ[a][target] = succ[a].get(target, 0) + w
+            del pred[target][b]
+            pred[target][a] = pred[target].get(a, 0) + w
+        for (source, w) in pred.pop(b).items():
+            pred[a][source] = pred[a].get(source, 0) + w
+            del succ[source][b]
+            succ[source][a] = succ[source].get(a, 0) + w
+
+    rank = {cid: ix for (ix, cid) in enumerate(clusters) if cid is not None}
+    cluster_of = {node.id: find(node.id) for node in order}
+    order = sorted(order, key=lambda n: rank[cluster_of[n.id]])
+    return _quotient(graph, order, cluster_of)
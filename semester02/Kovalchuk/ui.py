@@ -4,18 +4,13 @@ import tkinter as tk
 from collections import defaultdict
 from tkinter import simpledialog, filedialog, messagebox, ttk
 
-import dot_parser
-
 from graph import Graph as TGraph
+from layout import layered_layout, force_layout
 from system_graph import Graph as SGraph
-from task_graph import (
-    TaskGraph,
-    alg_diff_late_early,
-    alg_critical_path_start,
-    alg_node_connectivity,
-)
+from task_graph import TaskGraph, ALGORITHMS
 from reader import save, read_task_graph_file, read_system_graph_file
 from validators import (
+    CycleDetectedException,
     validate_acyclic,
     validate_not_empty,
     validate_connected,
@@ -57,6 +52,7 @@ class SystemGraphEditor(tk.Frame):
         self.canvas.bind('<Button-3>', self.on_canvas_right_click)
 
         self.__node_links = defaultdict(set)
+        self.__node_items = {}
         self.__editor_mode = 'draw'
         self.__connect_source = None
         self.__conn = None
@@ -80,6 +76,7 @@ class SystemGraphEditor(tk.Frame):
         self.g = SGraph()
         self.canvas.delete(tk.ALL)
         self.__node_links = defaultdict(set)
+        self.__node_items = {}
         self.__editor_mode = 'draw'
         self.__connect_source = None
         self.__conn = None
@@ -90,27 +87,14 @@ class SystemGraphEditor(tk.Frame):
             return
         self.on_new_clicked()
         del self.g
-        self.g = read_system_graph_file(filename)
-        generated_dot = (
-            dot_parser
-            .parse_dot_data(str(self.g))[0]
-            .create_dot()
-            .decode('utf-8')
-        )
-        dot_data = dot_parser.parse_dot_data(generated_dot)[0]
-        _, gh = map(float, dot_data.get_bb()[len('"0,0,'):-1].split(','))
-        nodes = [
-            (int(node.get_name()[len('Node_'):]), node)
-            for node in dot_data.get_nodes()
-            if node.get_name().startswith('Node_')
-        ]
+        (self.g, positions) = read_system_graph_file(filename,
+                                                     with_positions=True)
+        if positions is None:
+            positions = force_layout(self.g)
         node_gnode = {}
-        for (node_id, node) in nodes:
-            weight = self.g[node_id].weight
-            coordinates = tuple(map(float, node.get_pos()[1:-1].split(',')))
-            coordinates = (coordinates[0], gh - coordinates[1])
-            node_gnode[node_id] = self.draw_task_node(coordinates, weight,
-                                                      node_id)
+        for node in self.g:
+            node_gnode[node.id] = self.draw_task_node(positions[node.id],
+                                                      node.weight, node.id)
         for node in self.g:
             for edge in node.connections_out:
                 self.draw_connection(
@@ -122,7 +106,7 @@ class SystemGraphEditor(tk.Frame):
         filename = filedialog.asksaveasfilename(defaultextension='.dot')
         if not filename:
             return
-        save(self.g, filename)
+        save(self.g, filename, self.node_positions())
 
     def on_canvas_right_click(self, event):
         canvas_menu = tk.Menu(master=self.master, tearoff=0)
@@ -201,6 +185,7 @@ class SystemGraphEditor(tk.Frame):
             self.g.del_node(node_id)
             self.canvas.delete(node)
             self.canvas.delete(label)
+            del self.__node_items[node_id]
             for conn in self.__node_links[node_id]:
                 self.canvas.delete(conn)
 
@@ -224,14 +209,23 @@ class SystemGraphEditor(tk.Frame):
                 assert False
         self.canvas.tag_bind(node, '<Button-1>', on_node_clicked)
         self.canvas.tag_bind(label, '<Button-1>', on_node_clicked)
+        self.__node_items[node_id] = node
         return node
 
+    def node_positions(self):
+        positions = {}
+        for (node_id, node) in self.__node_items.items():
+            (x1, y1, x2, y2) = self.canvas.coords(node)
+            positions[node_id] = ((x1 + x2) / 2, (y1 + y2) / 2)
+        return positions
+
 
 class TaskGraphEditor(tk.Frame):
     def __init__(self, master=None):
         super().__init__(master)
         self.master = master
         self.g = TGraph()
+        self.g.keep_order()
         self.init_window()
 
     def init_window(self):
@@ -253,11 +247,7 @@ class TaskGraphEditor(tk.Frame):
         actions_menu.add_command(label='Validate tasks graph',
                                  command=self.on_validate_clicked)
         actions_menu.add_separator()
-        for alg in [
-            alg_diff_late_early,
-            alg_node_connectivity,
-            alg_critical_path_start
-        ]:
+        for alg in ALGORITHMS:
             actions_menu.add_command(
                 label=alg.__doc__,
                 command=lambda alg=alg: self.on_task_queue_clicked(alg)
@@ -271,6 +261,7 @@ class TaskGraphEditor(tk.Frame):
         self.canvas.bind('<Button-3>', self.on_canvas_right_click)
 
         self.__node_links = defaultdict(set)
+        self.__node_items = {}
         self.__editor_mode = 'draw'
         self.__connect_source = None
         self.__conn = None
@@ -292,8 +283,10 @@ class TaskGraphEditor(tk.Frame):
     def on_new_clicked(self):
         del self.g
         self.g = TGraph()
+        self.g.keep_order()
         self.canvas.delete(tk.ALL)
         self.__node_links = defaultdict(set)
+        self.__node_items = {}
         self.__editor_mode = 'draw'
         self.__connect_source = None
         self.__conn = None
@@ -304,27 +297,19 @@ class TaskGraphEditor(tk.Frame):
             return
         self.on_new_clicked()
         del self.g
-        self.g = read_task_graph_file(filename)
-        generated_dot = (
-            dot_parser
-            .parse_dot_data(str(self.g))[0]
-            .create_dot()
-            .decode('utf-8')
-        )
-        dot_data = dot_parser.parse_dot_data(generated_dot)[0]
-        _, gh = map(float, dot_data.get_bb()[len('"0,0,'):-1].split(','))
-        nodes = [
-            (int(node.get_name()[len('Node_'):]), node)
-            for node in dot_data.get_nodes()
-            if node.get_name().startswith('Node_')
-        ]
+        (self.g, positions) = read_task_graph_file(filename,
+                                                   with_positions=True)
+        try:
+            self.g.keep_order()
+        except CycleDetectedException:
+            # left to validation, the graph is still shown
+            pass
+        if positions is None:
+            positions = layered_layout(self.g)
         node_gnode = {}
-        for (node_id, node) in nodes:
-            weight = self.g[node_id].weight
-            coordinates = tuple(map(float, node.get_pos()[1:-1].split(',')))
-            coordinates = (coordinates[0], gh - coordinates[1])
-            node_gnode[node_id] = self.draw_task_node(coordinates, weight,
-                                                      node_id)
+        for node in self.g:
+            node_gnode[node.id] = self.draw_task_node(positions[node.id],
+                                                      node.weight, node.id)
         for node in self.g:
             for edge in node.connections_out:
                 self.draw_connection(
@@ -337,7 +322,7 @@ class TaskGraphEditor(tk.Frame):
         filename = filedialog.asksaveasfilename(defaultextension='.dot')
         if filename is None:
             return
-        save(self.g, filename)
+        save(self.g, filename, self.node_positions())
 
     def on_canvas_right_click(self, event):
         canvas_menu = tk.Menu(master=self.master, tearoff=0)
@@ -382,7 +367,11 @@ class TaskGraphEditor(tk.Frame):
     def connect_nodes(self, source, target, weight):
         source_id, source_node = source
         target_id, target_node = target
-        self.g.connect(source_id, target_id, weight)
+        try:
+            self.g.connect(source_id, target_id, weight)
+        except CycleDetectedException as e:
+            messagebox.showerror('Invalid connection', str(e))
+            return
         self.draw_connection(source, target, weight)
 
     def draw_connection(self, source, target, weight):
@@ -424,6 +413,7 @@ class TaskGraphEditor(tk.Frame):
             self.g.del_node(node_id)
             self.canvas.delete(node)
             self.canvas.delete(label)
+            del self.__node_items[node_id]
             for (conn, conn_label) in self.__node_links[node_id]:
                 self.canvas.delete(conn)
                 self.canvas.delete(conn_label)
@@ -458,8 +448,16 @@ class TaskGraphEditor(tk.Frame):
                 assert False
         self.canvas.tag_bind(node, '<Button-1>', on_node_clicked)
         self.canvas.tag_bind(label, '<Button-1>', on_node_clicked)
+        self.__node_items[node_id] = node
         return node
 
+    def node_positions(self):
+        positions = {}
+        for (node_id, node) in self.__node_items.items():
+            (x1, y1, x2, y2) = self.canvas.coords(node)
+            positions[node_id] = ((x1 + x2) / 2, (y1 + y2) / 2)
+        return positions
+
 
 class App(tk.Frame):
     def __init__(self, master=None):